@@ -10,5 +10,7 @@ setup(
         "openai>=1.12.0",
         "python-dotenv>=1.0.1",
         "google-search-results>=2.4.2",
+        "wikipedia>=1.4.0",
+        "requests>=2.0",
     ],
 ) 
\ No newline at end of file
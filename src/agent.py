@@ -1,262 +1,977 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import asyncio
+import queue
+import threading
+import time
 import openai
 import json
-from tools import CalculatorTool, GoogleSearchTool, DateTimeTool, WikipediaTool
+from tools import ToolSet, serialize_payload
+from cache import ToolCache, AnswerCache, ToolMemo, ANSWER_CACHE_MODES
+from prefetch import Prefetcher
+from history import ChatHistory, step_from_event, format_step
+from planning import PLAN_MODES, PlanStats, is_simple_query
+from context import ContextManager
+from tracing import Tracer, Trace
+from tools.resilience import (
+    Deadline, DeadlineExceeded, RetryPolicy, LatencyTracker, ConcurrencyLimit, aretry_call, hedged
+)
 
-class Agent:
-    def __init__(self, openai_api_key: str):
-        # Set up OpenAI client
-        self.client = openai.OpenAI(api_key=openai_api_key)
+# Failures of an LLM request that are worth retrying
+RETRYABLE_LLM_ERRORS = (
+    openai.APIConnectionError,  # Includes request timeouts
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+    TimeoutError
+)
+
+@dataclass
+class AgentEvent:
+    """
+    One event from a streaming agent run. Event types:
+    - "start": the run has started (data: query)
+    - "plan_token": a token of the plan (content)
+    - "plan": the complete plan (content; data: mode, skipped, latency_saved)
+    - "context": the prompt for the next round was compacted (data: the
+      ContextManager report, including tokens_saved)
+    - "answer_token": a token of model output; it belongs to the final answer
+      unless the same round goes on to call tools
+    - "tool_start": a tool call is about to run (data: id, name, args, thought)
+    - "tool_result": a tool call finished (content is the result; data as for
+      tool_start plus "success")
+    - "answer": the complete final answer (content; data["usage"] is the
+      run's RunUsage as a dict, data["trace"] its trace summary and
+      data["budget_exhausted"] the LoopBudget limit that forced it, if any)
+    - "error": the run failed (content is the error message; data["usage"]
+      and data["trace"])
+    """
+    type: str
+    content: str = ""
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class RunUsage:
+    """LLM calls, tool calls and token usage of one agent run"""
+    llm_calls: int = 0
+    tool_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add_llm_usage(self, usage) -> None:
+        """Add the usage reported on the last chunk of a streamed completion"""
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens
+        }
+
+
+# What each LoopBudget limit is called in the prompt that forces an answer
+_BUDGET_NAMES = {
+    "rounds": "tool rounds",
+    "tool_calls": "tool calls",
+    "tokens": "tokens",
+    "time": "time"
+}
+
+
+@dataclass
+class LoopBudget:
+    """
+    Limits on one run's ReAct loop; None means unlimited, the default for
+    every limit. max_rounds counts model rounds that may call tools, and
+    max_tool_calls counts tool calls that actually ran (not those answered
+    from the memo). When a limit is reached the model gets one more round,
+    without tools, to answer from what it has found.
+    """
+    max_rounds: Optional[int] = None
+    max_tool_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+
+    def exhausted(self, rounds: int, usage: RunUsage, elapsed: float) -> Optional[str]:
+        """The first limit used up after rounds tool rounds, or None"""
+        if self.max_rounds is not None and rounds >= self.max_rounds:
+            return "rounds"
+        if self.max_tool_calls is not None and usage.tool_calls >= self.max_tool_calls:
+            return "tool_calls"
+        if self.max_tokens is not None and usage.prompt_tokens + usage.completion_tokens >= self.max_tokens:
+            return "tokens"
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return "time"
+        return None
+
+
+def format_event(event: AgentEvent) -> Optional[str]:
+    """Render a completed step event as markdown, or None for partial events"""
+    step = step_from_event(event)
+    return format_step(step) if step is not None and step["type"] != "error" else None
+
+
+class AsyncAgent:
+    """
+    ReAct agent driven by the async OpenAI client. Many conversations can
+    share one event loop; the blocking tools run on a bounded thread pool.
+    """
+
+    def __init__(
+        self,
+        openai_api_key: str,
+        parallel_tool_calls: bool = True,
+        max_workers: int = 32,
+        tool_concurrency: Optional[Dict[str, int]] = None,
+        cache_tool_results: bool = True,
+        tool_cache: Optional[ToolCache] = None,
+        cache_answers: bool = False,
+        answer_cache: Optional[AnswerCache] = None,
+        plan: str = "on",
+        context_manager: Optional[ContextManager] = None,
+        tracer: Optional[Tracer] = None,
+        tools: Optional[List[str]] = None,
+        tool_instances: Optional[Dict[str, Any]] = None,
+        http_client: Optional[Any] = None,
+        llm_timeout: Optional[float] = 60.0,
+        tool_timeout: Optional[float] = 30.0,
+        deadline: Optional[float] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedge_tools: bool = False,
+        prefetch: bool = False,
+        prefetcher: Optional[Prefetcher] = None,
+        budget: Optional[LoopBudget] = None
+    ):
+        # Set up OpenAI client. Its keep-alive connection pool is shared by
+        # every conversation run through this agent; pass an httpx.AsyncClient
+        # as http_client to size the pool. Retries are left to retry_policy.
+        self.client = openai.AsyncOpenAI(api_key=openai_api_key, http_client=http_client, max_retries=0)
+
+        # Timeouts: llm_timeout bounds opening a completion and the gap
+        # between its chunks, tool_timeout bounds each tool call, and
+        # deadline (seconds, or None) bounds a whole query across all rounds
+        self.llm_timeout = llm_timeout
+        self.tool_timeout = tool_timeout
+        self.deadline = deadline
+        # Limits on rounds, tool calls, tokens and time per query, after
+        # which the model must answer without further tools
+        self.budget = budget or LoopBudget()
+        # Transient LLM failures before the first chunk are retried with
+        # jittered exponential backoff
+        self.retry_policy = retry_policy or RetryPolicy(retryable=RETRYABLE_LLM_ERRORS)
+        # With hedge_tools, a call to a hedgeable tool that runs past the
+        # tool's p95 latency gets a duplicate request, and the first to
+        # finish wins
+        self.hedge_tools = hedge_tools
+        self.tool_latency = LatencyTracker()
         
-        # Initialize tools
-        self.tools = {
-            "calculator": CalculatorTool(),
-            "google_search": GoogleSearchTool(),
-            "datetime": DateTimeTool(),
-            "wikipedia": WikipediaTool()
+        # Tools from the registry (all of them unless a subset is named);
+        # each is imported and constructed on first use
+        self.tools = ToolSet(tools, tool_instances)
+
+        # The tools block on network I/O, so they run on a bounded pool shared
+        # by every conversation; tool calls from one model turn run
+        # concurrently unless parallel_tool_calls is disabled
+        self.parallel_tool_calls = parallel_tool_calls
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        # Per-tool concurrency limits, so a burst of parallel tool calls cannot
+        # overrun the SerpAPI quota (tools without a limit are unbounded)
+        self.tool_concurrency = {
+            name: spec.max_concurrency
+            for name, spec in self.tools.specs.items() if spec.max_concurrency
+        }
+        if tool_concurrency:
+            self.tool_concurrency.update(tool_concurrency)
+        self._tool_limits = {
+            name: ConcurrencyLimit(limit)
+            for name, limit in self.tool_concurrency.items()
         }
         
+        # Results of deterministic tools are cached (in memory unless a
+        # ToolCache with another backend is given)
+        self.tool_cache = (tool_cache or ToolCache()) if cache_tool_results else None
+
+        # Opt-in cache of final answers by normalized query, for as long as
+        # the tools they used allow (see cache.DEFAULT_ANSWER_TTLS)
+        self.answer_cache = (answer_cache or AnswerCache()) if cache_answers or answer_cache else None
+
+        # Opt-in speculative execution of the follow-up calls a tool's spec
+        # predicts, e.g. reading the top Wikipedia search results while the
+        # model decides which one it wants
+        self.prefetcher = (prefetcher or Prefetcher()) if prefetch or prefetcher else None
+
+        # Planning mode (see planning.PLAN_MODES) and the latency it saves
+        if plan not in PLAN_MODES:
+            raise ValueError(f"plan must be one of {PLAN_MODES}, got '{plan}'")
+        self.plan = plan
+        self.plan_stats = PlanStats()
+
+        # Keeps the prompt of each round within a token budget
+        self.context_manager = context_manager or ContextManager()
+
+        # Records a span per LLM call and tool execution of each run
+        self.tracer = tracer or Tracer()
+
         # Define tools for OpenAI
-        self.available_tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "calculator",
-                    "description": "Perform mathematical calculations with support for basic operations and math functions",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "expression": {
-                                "type": "string",
-                                "description": "The mathematical expression to evaluate (e.g., '2 + 2', 'math.sqrt(16)')"
-                            }
-                        },
-                        "required": ["expression"],
-                        "additionalProperties": False
-                    },
-                    "strict": True
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "google_search",
-                    "description": "Search the internet for current information",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "The search query to find information"
-                            }
-                        },
-                        "required": ["query"],
-                        "additionalProperties": False
-                    },
-                    "strict": True
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "datetime",
-                    "description": "Get dates relative to today, including the day of the week",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "operation": {
-                                "type": "string",
-                                "enum": ["today", "days_ago", "days_ahead"],
-                                "description": "The type of date calculation to perform"
-                            },
-                            "days": {
-                                "type": "integer",
-                                "description": "Number of days for ago/ahead operations. Required when operation is 'days_ago' or 'days_ahead'."
-                            }
-                        },
-                        "required": ["operation", "days"],
-                        "additionalProperties": False
-                    },
-                    "strict": True
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "wikipedia",
-                    "description": "Search Wikipedia articles and read their content",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "action": {
-                                "type": "string",
-                                "enum": ["search", "read"],
-                                "description": "Whether to search for articles or read a specific article"
-                            },
-                            "query": {
-                                "type": "string",
-                                "description": "The search term or article title"
-                            }
-                        },
-                        "required": ["action", "query"],
-                        "additionalProperties": False
-                    },
-                    "strict": True
-                }
-            }
-        ]
+        self.available_tools = self.tools.schemas()
         
-        # Create the system prompt
-        self.system_prompt = """You are a helpful AI assistant that can use tools to answer questions.
+        # Build the system and planning prompts from the tools' declarations
+        specs = list(self.tools.specs.values())
+        system_guidance = "".join(f"{spec.system_guidance}\n" for spec in specs if spec.system_guidance)
+        self.system_prompt = f"""You are a helpful AI assistant that can use tools to answer questions.
 Your task is to help users by using the available tools appropriately.
-For date-related queries, always use the datetime tool to get accurate results.
-For the datetime tool:
-- Use operation="today" with days=0 to get today's date
-- Use operation="days_ago" with the number of days to get a past date
-- Use operation="days_ahead" with the number of days to get a future date
-For Wikipedia queries:
-- Use action="search" to find relevant articles
-- Use action="read" to get the content of a specific article
-Always show your reasoning and use tools to verify facts rather than making assumptions."""
-
-        # Add planning prompt
-        self.planning_prompt = """You are a planning assistant. Your task is to create a step-by-step plan to answer the user's question.
+{system_guidance}Always show your reasoning and use tools to verify facts rather than making assumptions."""
+
+        tool_list = "\n".join(f"{number}. {spec.plan_hint or spec.name}" for number, spec in enumerate(specs, 1))
+        plan_guidance = "".join(f"{spec.plan_guidance}\n\n" for spec in specs if spec.plan_guidance)
+        self.planning_prompt = f"""You are a planning assistant. Your task is to create a step-by-step plan to answer the user's question.
 Available tools:
-1. calculator: For mathematical calculations
-2. google_search: For searching the internet for current information
-3. datetime: For date calculations (today, days_ago, days_ahead)
-4. wikipedia: For searching and reading Wikipedia articles
-   - Use action="search" to find relevant articles
-   - Use action="read" to get article content and summary
+{tool_list}
 
 Create a plan that breaks down the task into steps. Each step should specify:
 1. Which tool to use
 2. What input to provide to the tool
 3. How to use the result
 
-For Wikipedia queries, it's often good to:
-1. First search for relevant articles
-2. Then read the most relevant article
-3. Use google_search if additional current information is needed
-
-Respond in this format:
+{plan_guidance}Respond in this format:
 PLAN:
 1. [First step with tool and purpose]
 2. [Second step with tool and purpose]
 ...
 REASONING: [Why this plan will answer the question]"""
 
-    def _execute_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a tool with the given arguments"""
+    def _execute_tool(self, tool_name: str, tool_args: Dict[str, Any], use_prefetch: bool = True) -> Dict[str, Any]:
+        """
+        Execute a tool with the given arguments, serving it from the prefetch
+        buffer or the cache when possible. The caller holds the tool's
+        concurrency slot.
+        """
         if tool_name not in self.tools:
             return {
                 "success": False,
                 "result": f"Error: Tool '{tool_name}' not found"
             }
-        
-        # Convert the arguments to the format expected by each tool
-        if tool_name == "datetime":
-            operation = tool_args["operation"]
-            days = tool_args["days"]  # Now required
-            if operation == "today":
-                query = "today"
+
+        spec = self.tools.spec(tool_name)
+        if use_prefetch and self.prefetcher is not None and spec.prefetch is not None:
+            prefetched = self.prefetcher.take(tool_name, tool_args)
+            if prefetched is not None:
+                return {**prefetched, "prefetched": True}
+
+        # Non-deterministic tools (e.g. datetime) always run
+        cache = self.tool_cache if spec.cacheable else None
+        if cache is not None:
+            cached = cache.get(tool_name, tool_args)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        try:
+            # The tool is imported and constructed on its first call
+            result = self.tools.get(tool_name).run(spec.to_query(tool_args))
+        except Exception as e:
+            return {
+                "success": False,
+                "result": f"Error: {str(e)}"
+            }
+        if cache is not None and result["success"]:
+            cache.set(tool_name, tool_args, result)
+        return result
+
+    def _run_tool_call(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute one parsed tool call. The result carries its serialized
+        "payload" for the tool message.
+        """
+        if call["args"] is None:
+            result = {
+                "success": False,
+                "result": call["error"]
+            }
+        else:
+            result = self._execute_tool(call["name"], call["args"])
+        return {**result, "payload": serialize_payload(result["result"])}
+
+    def _prefetch_call(self, tool_name: str, tool_args: Dict[str, Any]) -> Dict[str, Any]:
+        # A prefetch never waits for a slot: without a free one it is skipped,
+        # and the model's own call runs instead
+        limit = self._tool_limits.get(tool_name)
+        if limit is not None and not limit.try_acquire():
+            return {"success": False, "result": "Error: No free slot to prefetch this call"}
+        try:
+            return self._execute_tool(tool_name, tool_args, use_prefetch=False)
+        finally:
+            if limit is not None:
+                limit.release()
+
+    async def _arun_tool_call(self, call: Dict[str, Any], trace: Trace, deadline: Deadline) -> Dict[str, Any]:
+        """
+        Async adapter that runs a blocking tool call on the tool pool, within
+        the tool timeout and the query's deadline. A call waits for its
+        tool's concurrency slot before it is handed to a thread, so waiting
+        holds no thread and a call that times out while waiting never
+        starts. A call that times out once started returns an error result;
+        its thread is left to finish on its own and then frees the slot.
+        """
+        loop = asyncio.get_running_loop()
+        spec = self.tools.spec(call["name"])
+        hedge_after = None
+        if self.hedge_tools and spec is not None and spec.hedge and call["args"] is not None:
+            hedge_after = self.tool_latency.percentile(call["name"])
+        timeout = deadline.timeout(self.tool_timeout)
+        with trace.span(call["name"], "tool", args=call["args"]) as span:
+            started = time.perf_counter()
+            limit = self._tool_limits.get(call["name"]) if call["args"] is not None else None
+            if limit is None:
+                run = lambda: loop.run_in_executor(self._executor, self._run_tool_call, call)
             else:
-                query = f"{operation}:{days}"
-            return self.tools[tool_name].run(query)
-        elif tool_name == "calculator":
-            return self.tools[tool_name].run(tool_args["expression"])
-        elif tool_name == "google_search":
-            return self.tools[tool_name].run(tool_args["query"])
-        elif tool_name == "wikipedia":
-            action = tool_args["action"]
-            query = tool_args["query"]
-            formatted_query = f"{action}:{query}"
-            return self.tools[tool_name].run(formatted_query)
-        
-        return {
-            "success": False,
-            "result": "Error: Invalid tool configuration"
-        }
+                async def run():
+                    await limit.acquire()
+                    try:
+                        future = self._executor.submit(self._run_tool_call, call)
+                    except BaseException:
+                        limit.release()
+                        raise
+                    # Released when the thread is done (or the call is
+                    # cancelled before it starts), not when the wait times out
+                    future.add_done_callback(lambda _: limit.release())
+                    return await asyncio.wrap_future(future)
+            try:
+                if hedge_after is None:
+                    # Waiting on the executor future directly avoids a task per call
+                    result, was_hedged = await asyncio.wait_for(run(), timeout), False
+                else:
+                    result, was_hedged = await asyncio.wait_for(hedged(run, hedge_after), timeout)
+            except asyncio.TimeoutError:
+                message = f"Error: Tool '{call['name']}' timed out after {timeout:.1f}s"
+                result = {"success": False, "result": message, "payload": message}
+                was_hedged = hedge_after is not None
+                span.attributes["timed_out"] = True
+            else:
+                if not result.get("cached") and not result.get("prefetched"):
+                    self.tool_latency.observe(call["name"], time.perf_counter() - started)
+            span.attributes.update(
+                success=result["success"],
+                cached=result.get("cached", False),
+                prefetched=result.get("prefetched", False),
+                hedged=was_hedged,
+                result_chars=len(result["payload"])
+            )
+        # Start the follow-up calls this result makes likely while the model
+        # decides on its next step
+        if self.prefetcher is not None and spec is not None and spec.prefetch is not None and result["success"]:
+            self.prefetcher.schedule(
+                call["name"],
+                spec.prefetch(call["args"], result["result"]),
+                self._prefetch_call,
+                self._executor,
+                owner=trace.trace_id
+            )
+        return result
+
+    def _memo_key(self, call: Dict[str, Any]) -> Optional[str]:
+        """Memo key of a call, or None if its result must not be reused"""
+        spec = self.tools.spec(call["name"])
+        if call["args"] is None or spec is None or not spec.cacheable:
+            return None
+        return ToolCache.make_key(call["name"], call["args"])
+
+    @staticmethod
+    def _deduplicated(call: Dict[str, Any], result: Dict[str, Any], trace: Trace) -> Dict[str, Any]:
+        """Record a repeated call answered with an earlier call's result"""
+        with trace.span(call["name"], "tool", args=call["args"], deduplicated=True,
+                        success=result["success"], result_chars=len(result["payload"])):
+            pass
+        return {**result, "deduplicated": True}
 
-    def _create_plan(self, query: str) -> str:
-        """Create a plan for solving the query"""
+    @staticmethod
+    def _remember(memo: ToolMemo, key: Optional[str], result: Dict[str, Any]) -> None:
+        if key is not None and result["success"]:
+            memo.set(key, {"success": True, "result": result["result"], "payload": result["payload"]})
+
+    async def _run_tool_calls(
+        self,
+        calls: List[Dict[str, Any]],
+        trace: Trace,
+        deadline: Deadline,
+        memo: ToolMemo
+    ) -> AsyncIterator[tuple]:
+        """
+        Execute the parsed tool calls from one model turn, yielding
+        (call, result) pairs in the same order as the calls. A call already
+        made in the conversation (or earlier in the turn) is answered from
+        the memo instead of running again.
+        """
+        keys = [self._memo_key(call) for call in calls]
+        if not self.parallel_tool_calls:
+            for call, key in zip(calls, keys):
+                memoized = memo.get(key) if key is not None else None
+                if memoized is not None:
+                    yield call, self._deduplicated(call, memoized, trace)
+                    continue
+                result = await self._arun_tool_call(call, trace, deadline)
+                self._remember(memo, key, result)
+                yield call, result
+            return
+
+        # Per call: (memoized result, task, whether the task is an earlier call's)
+        sources = []
+        tasks = {}
+        for index, (call, key) in enumerate(zip(calls, keys)):
+            memoized = memo.get(key) if key is not None else None
+            if memoized is not None:
+                sources.append((memoized, None, False))
+            elif key is not None and key in tasks:
+                sources.append((None, tasks[key], True))
+            else:
+                task = asyncio.ensure_future(self._arun_tool_call(call, trace, deadline))
+                tasks[key if key is not None else index] = task
+                sources.append((None, task, False))
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": self.planning_prompt},
-                    {"role": "user", "content": f"Create a plan to answer: {query}"}
-                ],
-                temperature=0
+            for call, key, (memoized, task, duplicate) in zip(calls, keys, sources):
+                if memoized is not None:
+                    yield call, self._deduplicated(call, memoized, trace)
+                    continue
+                result = await task
+                if duplicate:
+                    yield call, self._deduplicated(call, result, trace)
+                    continue
+                self._remember(memo, key, result)
+                yield call, result
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    @staticmethod
+    def _record_chunk(span, usage: RunUsage, chunk) -> None:
+        """Add a streamed chunk's timing and token usage to the call's span"""
+        if getattr(chunk, "usage", None) is not None:
+            usage.add_llm_usage(chunk.usage)
+            span.attributes["prompt_tokens"] = chunk.usage.prompt_tokens
+            span.attributes["completion_tokens"] = chunk.usage.completion_tokens
+        elif "first_token" not in span.attributes:
+            span.attributes["first_token"] = time.time() - span.start
+
+    @staticmethod
+    async def _next_chunk(chunks: AsyncIterator, deadline: Deadline):
+        """
+        The stream's next chunk, or None at its end. A read that stalls past
+        the deadline raises DeadlineExceeded.
+        """
+        deadline.check()
+        remaining = deadline.remaining()
+        try:
+            if remaining is None:
+                return await chunks.__anext__()
+            # Only runs with a deadline pay for a timeout per read
+            return await asyncio.wait_for(chunks.__anext__(), remaining)
+        except StopAsyncIteration:
+            return None
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Query exceeded its {deadline.seconds}s deadline")
+
+    async def _stream_completion(self, deadline: Deadline, **request) -> AsyncIterator:
+        """
+        Stream the chunks of a chat completion. The request's timeout (the
+        HTTP client's connect and read timeouts, so it also bounds the gap
+        between chunks) is llm_timeout, shortened to what is left of the
+        deadline; each read is also cut off when the deadline passes, so a
+        stalled stream cannot outlive it. Opening the stream, up to its first
+        chunk, is retried on transient errors; once chunks have been passed
+        on, a failure is raised as is.
+        """
+        async def open_stream():
+            deadline.check()
+            stream = await self.client.chat.completions.create(
+                stream=True,
+                timeout=deadline.timeout(self.llm_timeout),
+                **request
             )
-            return response.choices[0].message.content
+            chunks = stream.__aiter__()
+            return chunks, await self._next_chunk(chunks, deadline)
+
+        chunks, chunk = await aretry_call(open_stream, self.retry_policy, deadline)
+        while chunk is not None:
+            yield chunk
+            chunk = await self._next_chunk(chunks, deadline)
+
+    async def _stream_plan(self, query: str, usage: RunUsage, trace: Trace, deadline: Deadline) -> AsyncIterator[str]:
+        """Stream the tokens of a plan for solving the query"""
+        messages = [
+            {"role": "system", "content": self.planning_prompt},
+            {"role": "user", "content": f"Create a plan to answer: {query}"}
+        ]
+        try:
+            usage.llm_calls += 1
+            with trace.span("plan", "llm", model="gpt-4", prompt_chars=self._prompt_chars(messages)) as span:
+                stream = self._stream_completion(
+                    deadline,
+                    model="gpt-4",
+                    messages=messages,
+                    temperature=0,
+                    stream_options={"include_usage": True}
+                )
+                response_chars = 0
+                async for chunk in stream:
+                    self._record_chunk(span, usage, chunk)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        response_chars += len(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                span.attributes["response_chars"] = response_chars
         except Exception as e:
-            return f"Error creating plan: {str(e)}"
+            yield f"Error creating plan: {str(e)}"
+
+    @staticmethod
+    def _prompt_chars(messages: List[Dict[str, Any]]) -> int:
+        return sum(len(message.get("content") or "") for message in messages)
+
+    async def _collect_plan(self, query: str, usage: RunUsage, trace: Trace, deadline: Deadline) -> tuple:
+        """Create a plan without streaming it; returns (plan, latency)"""
+        started = time.perf_counter()
+        plan = "".join([token async for token in self._stream_plan(query, usage, trace, deadline)])
+        latency = time.perf_counter() - started
+        self.plan_stats.observe_plan(latency)
+        return plan, latency
 
-    def run(self, query: str) -> str:
+    def _skip_plan(self, mode: str, latency_saved: float) -> AgentEvent:
+        self.plan_stats.record(mode, True, latency_saved)
+        return AgentEvent("plan", "", {"mode": mode, "skipped": True, "latency_saved": latency_saved})
+
+    async def astream(
+        self,
+        query: str,
+        plan: Optional[str] = None,
+        history: Optional[List[Dict[str, Any]]] = None,
+        deadline: Optional[float] = None,
+        cache: str = "use",
+        budget: Optional[LoopBudget] = None,
+        memo: Optional[ToolMemo] = None
+    ) -> AsyncIterator[AgentEvent]:
         """
-        Run the agent with a query and return the response
+        Run the agent with a query, yielding AgentEvents as the plan, tool
+        calls and final answer are produced. plan overrides the agent's
+        planning mode for this run; history is earlier user and assistant
+        messages of the conversation; deadline overrides the agent's
+        per-query deadline; cache is the answer cache mode (see
+        cache.ANSWER_CACHE_MODES); budget overrides the agent's LoopBudget;
+        memo holds the conversation's tool results (a fresh one per run if
+        None). The agent keeps no per-run state, so any number of
+        conversations can share it.
         """
+        mode = plan or self.plan
+        run_started = time.perf_counter()
+        deadline = Deadline(deadline if deadline is not None else self.deadline)
+        budget = budget or self.budget
+        memo = memo if memo is not None else ToolMemo()
+        # The budget limit that ran out, once the model has been told to answer
+        exhausted = None
+        usage = RunUsage()
+        trace = self.tracer.start_trace(query)
+        plan_task = None
+        # Message carrying the plan, and what replaces it once it is used
+        plan_index = None
+        plan_replacement = None
+        # Answers that depend on earlier turns are not cached
+        answer_cache = self.answer_cache if cache != "bypass" and not history else None
+        tools_used = []
+        tools_failed = False
         try:
-            # First, create a plan
-            plan = self._create_plan(query)
-            steps = [f"🤔 **Question:** {query}\n\n📋 **Planning Phase:**\n{plan}"]
-            
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": f"Execute this plan to answer the question: {query}\n\nPlan:\n{plan}"}
-            ]
+            if mode not in PLAN_MODES:
+                raise ValueError(f"plan must be one of {PLAN_MODES}, got '{mode}'")
+            if cache not in ANSWER_CACHE_MODES:
+                raise ValueError(f"cache must be one of {ANSWER_CACHE_MODES}, got '{cache}'")
+            yield AgentEvent("start", data={"query": query})
+
+            cached = answer_cache.get(query) if answer_cache is not None and cache == "use" else None
+            if cached is not None:
+                trace.finish(answer_chars=len(cached["answer"]), cached_answer=True)
+                yield AgentEvent("answer", cached["answer"], {
+                    "usage": usage.to_dict(),
+                    "trace": trace.summary(),
+                    "cached": True
+                })
+                return
+            messages = [{"role": "system", "content": self.system_prompt}] + list(history or [])
+
+            if mode == "on" or (mode == "auto" and not is_simple_query(query)):
+                # First, create a plan
+                started = time.perf_counter()
+                plan_text = ""
+                async for token in self._stream_plan(query, usage, trace, deadline):
+                    plan_text += token
+                    yield AgentEvent("plan_token", token)
+                self.plan_stats.observe_plan(time.perf_counter() - started)
+                self.plan_stats.record(mode, False, 0.0)
+                yield AgentEvent("plan", plan_text, {"mode": mode, "skipped": False, "latency_saved": 0.0})
+                plan_index = len(messages)
+                plan_replacement = query
+                messages.append({"role": "user", "content": f"Execute this plan to answer the question: {query}\n\nPlan:\n{plan_text}"})
+            else:
+                if mode == "parallel":
+                    # Plan concurrently with the first tool-selection call
+                    plan_task = asyncio.ensure_future(self._collect_plan(query, usage, trace, deadline))
+                    first_round_started = time.perf_counter()
+                else:
+                    yield self._skip_plan(mode, self.plan_stats.estimated_plan_latency())
+                messages.append({"role": "user", "content": query})
             
+            round_number = 0
             while True:
-                # Get the next action from the model
-                response = self.client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=messages,
-                    tools=self.available_tools,
-                    tool_choice="auto",
-                    temperature=0
-                )
-                
-                message = response.choices[0].message
-                
-                # If no tool calls, we're done
-                if not message.tool_calls:
-                    if message.content:
-                        steps.append("---")
-                        steps.append(f"✨ **Final Answer:** {message.content}")
-                    return "\n\n".join(steps)
+                round_number += 1
+                if exhausted is None:
+                    exhausted = budget.exhausted(round_number - 1, usage, time.perf_counter() - run_started)
+                    if exhausted is not None:
+                        messages.append({"role": "user", "content": (
+                            f"You have run out of {_BUDGET_NAMES[exhausted]} for this question. Do not call "
+                            "any more tools; give your best final answer from the information gathered so far."
+                        )})
+
+                # Compact the history to the per-round token budget
+                prompt, report = self.context_manager.prepare(messages, plan_index, plan_replacement)
+                yield AgentEvent("context", data=report)
+
+                # Get the next action from the model, streaming its text
+                usage.llm_calls += 1
+                with trace.span("round", "llm", model="gpt-4o", round=round_number,
+                                prompt_chars=self._prompt_chars(prompt)) as span:
+                    stream = self._stream_completion(
+                        deadline,
+                        model="gpt-4o",
+                        messages=prompt,
+                        tools=self.available_tools,
+                        # The tools stay declared for the earlier tool
+                        # messages, but a forced answer may not call them
+                        tool_choice="none" if exhausted else "auto",
+                        temperature=0,
+                        stream_options={"include_usage": True}
+                    )
+
+                    content = ""
+                    tool_calls = {}
+                    async for chunk in stream:
+                        self._record_chunk(span, usage, chunk)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            content += delta.content
+                            yield AgentEvent("answer_token", delta.content)
+                        # Tool calls arrive as fragments keyed by their index
+                        for fragment in delta.tool_calls or []:
+                            tool_call = tool_calls.setdefault(fragment.index, {
+                                "id": "",
+                                "type": "function",
+                                "function": {"name": "", "arguments": ""}
+                            })
+                            if fragment.id:
+                                tool_call["id"] = fragment.id
+                            if fragment.function and fragment.function.name:
+                                tool_call["function"]["name"] += fragment.function.name
+                            if fragment.function and fragment.function.arguments:
+                                tool_call["function"]["arguments"] += fragment.function.arguments
+                    span.attributes["response_chars"] = len(content) + sum(
+                        len(tool_call["function"]["arguments"]) for tool_call in tool_calls.values()
+                    )
+                    span.attributes["tool_calls"] = len(tool_calls)
+
+                # If no tool calls, we're done; past the budget, any stray
+                # tool calls are ignored
+                if not tool_calls or exhausted:
+                    if plan_task is not None:
+                        # Answered without needing the plan at all
+                        plan_task.cancel()
+                        plan_task = None
+                        yield self._skip_plan(mode, self.plan_stats.estimated_plan_latency() or time.perf_counter() - first_round_started)
+                    if exhausted and not content:
+                        content = f"I ran out of {_BUDGET_NAMES[exhausted]} before I could finish answering this question."
+                    # Answers built on failed tool calls or cut short by the
+                    # budget are not worth keeping
+                    if answer_cache is not None and not tools_failed and not exhausted:
+                        answer_cache.set(query, content, tools_used)
+                    trace.finish(answer_chars=len(content), budget_exhausted=exhausted)
+                    yield AgentEvent("answer", content, {
+                        "usage": usage.to_dict(),
+                        "trace": trace.summary(),
+                        "cached": False,
+                        "budget_exhausted": exhausted
+                    })
+                    return
                 
-                # Process each tool call
-                for tool_call in message.tool_calls:
-                    # Extract tool call details
-                    function_name = tool_call.function.name
+                # Parse the arguments of every tool call in this turn
+                tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+                calls = []
+                for tool_call in tool_calls:
                     try:
-                        function_args = json.loads(tool_call.function.arguments)
+                        function_args = json.loads(tool_call["function"]["arguments"])
+                        error = None
                     except Exception as e:
-                        steps.append(f"Error parsing tool arguments: {str(e)}")
-                        continue
-                    
-                    # Add the tool call to steps
-                    steps.append("---")
-                    steps.append(f"💭 **Executing Plan Step:** {message.content if message.content else 'Using tool to find information'}")
-                    steps.append(f"🔧 **Tool:** {function_name}")
-                    steps.append(f"📥 **Input:** {json.dumps(function_args, indent=2)}")
-                    
-                    # Execute the tool
-                    result = self._execute_tool(function_name, function_args)
-                    steps.append(f"📝 **Result:** {result['result']}")
-                    
-                    # Add the interaction to messages
-                    messages.append({
-                        "role": "assistant",
-                        "content": message.content,
-                        "tool_calls": [tool_call]
+                        function_args = None
+                        error = f"Error parsing tool arguments: {str(e)}"
+                    calls.append({
+                        "tool_call": tool_call,
+                        "name": tool_call["function"]["name"],
+                        "args": function_args,
+                        "error": error
                     })
+
+                # Calls beyond the tool call budget are answered with an error
+                # instead of being run. Calls the memo or an identical call
+                # earlier in the turn answers do not run, so they are free.
+                if budget.max_tool_calls is not None:
+                    remaining = budget.max_tool_calls - usage.tool_calls
+                    to_run = set()
+                    for call in calls:
+                        key = self._memo_key(call)
+                        if call["args"] is None or (key is not None and (key in memo or key in to_run)):
+                            continue
+                        if remaining <= 0:
+                            call["args"] = None
+                            call["error"] = "Error: Tool call budget exhausted; this call was not run"
+                            continue
+                        remaining -= 1
+                        if key is not None:
+                            to_run.add(key)
+
+                for call in calls:
+                    if call["args"] is not None:
+                        yield AgentEvent("tool_start", data=self._call_data(call, content))
+
+                messages.append({
+                    "role": "assistant",
+                    "content": content or None,
+                    "tool_calls": tool_calls
+                })
+
+                # Report results and tool messages in the original call order,
+                # each as soon as it and every call before it has finished
+                async for call, result in self._run_tool_calls(calls, trace, deadline, memo):
+                    if call["args"] is not None and not result.get("deduplicated"):
+                        usage.tool_calls += 1
+                    payload = result["payload"]
+                    data = self._call_data(call, content)
+                    data["success"] = result["success"]
+                    tools_used.append(call["name"])
+                    tools_failed = tools_failed or not result["success"]
+                    yield AgentEvent("tool_result", payload, data)
+
                     messages.append({
                         "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": str(result["result"])
+                        "tool_call_id": call["tool_call"]["id"],
+                        "content": payload
                     })
+
+                if plan_task is not None:
+                    # The plan ran while the first round did; the overlap is
+                    # the latency saved
+                    first_round_latency = time.perf_counter() - first_round_started
+                    plan_text, plan_latency = await plan_task
+                    plan_task = None
+                    latency_saved = min(plan_latency, first_round_latency)
+                    self.plan_stats.record(mode, False, latency_saved)
+                    yield AgentEvent("plan", plan_text, {"mode": mode, "skipped": False, "latency_saved": latency_saved})
+                    plan_index = len(messages)
+                    plan_replacement = None
+                    messages.append({"role": "user", "content": f"Use this plan for the remaining steps:\n{plan_text}"})
                 
         except Exception as e:
-            return f"Error: {str(e)}" 
\ No newline at end of file
+            trace.finish(error=str(e))
+            yield AgentEvent("error", str(e), {"usage": usage.to_dict(), "trace": trace.summary()})
+        finally:
+            if plan_task is not None:
+                plan_task.cancel()
+            # Prefetches this run did not use are no longer needed
+            if self.prefetcher is not None:
+                self.prefetcher.cancel(trace.trace_id)
+            trace.finish()
+
+    @staticmethod
+    def _call_data(call: Dict[str, Any], thought: str) -> Dict[str, Any]:
+        """Event payload describing a tool call"""
+        return {
+            "id": call["tool_call"]["id"],
+            "name": call["name"],
+            "args": call["args"],
+            "thought": thought
+        }
+
+    async def arun(
+        self,
+        query: str,
+        plan: Optional[str] = None,
+        return_trace: bool = False,
+        history: Optional[List[Dict[str, Any]]] = None,
+        cache: str = "use",
+        budget: Optional[LoopBudget] = None
+    ):
+        """
+        Run the agent with a query and return the response, or a
+        (response, trace summary) pair when return_trace is set
+        """
+        steps = []
+        summary = None
+        async for event in self.astream(query, plan, history, cache=cache, budget=budget):
+            if event.type == "error":
+                steps = [f"Error: {event.content}"]
+            else:
+                step = format_event(event)
+                if step:
+                    steps.append(step)
+            if event.type in ("answer", "error"):
+                summary = event.data["trace"]
+        response = "\n\n".join(steps)
+        return (response, summary) if return_trace else response
+
+
+class _LoopThread:
+    """Event loop running forever on a daemon thread, for sync callers"""
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+
+    def run(self, coro):
+        """Run a coroutine on the loop and block until it finishes"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        """Drive an async iterator on the loop, yielding its items here"""
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            finally:
+                items.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._get_loop())
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                yield item
+            future.result()
+        finally:
+            # Stop the run if the caller abandons the iterator early
+            future.cancel()
+
+
+class Agent(AsyncAgent):
+    """
+    Blocking interface to AsyncAgent. Every call from every thread is driven
+    by one background event loop owned by the agent, so the async client's
+    connection pool stays bound to a single loop.
+    """
+
+    def __init__(self, openai_api_key: str, **kwargs):
+        super().__init__(openai_api_key, **kwargs)
+        self._loop_thread = _LoopThread()
+
+    def run(
+        self,
+        query: str,
+        plan: Optional[str] = None,
+        return_trace: bool = False,
+        history: Optional[List[Dict[str, Any]]] = None,
+        cache: str = "use",
+        budget: Optional[LoopBudget] = None
+    ):
+        """
+        Run the agent with a query and return the response, or a
+        (response, trace summary) pair when return_trace is set
+        """
+        return self._loop_thread.run(self.arun(query, plan, return_trace, history, cache, budget))
+
+    def stream(
+        self,
+        query: str,
+        plan: Optional[str] = None,
+        history: Optional[List[Dict[str, Any]]] = None,
+        cache: str = "use",
+        budget: Optional[LoopBudget] = None,
+        memo: Optional[ToolMemo] = None
+    ) -> Iterator[AgentEvent]:
+        """
+        Run the agent with a query, yielding AgentEvents as they are produced
+        """
+        return self._loop_thread.iterate(self.astream(query, plan, history, cache=cache, budget=budget, memo=memo))
+
+
+class Conversation:
+    """
+    One user's conversation with a shared agent. It holds only the chat
+    history; the client and its connection pool, the tools, caches and
+    thread pools all belong to the agent, so a conversation costs little
+    more than its messages.
+    """
+
+    def __init__(
+        self,
+        agent: AsyncAgent,
+        history_turns: int = 0,
+        max_turns: Optional[int] = None,
+        spill_dir: Optional[str] = None
+    ):
+        self.agent = agent
+        # Number of earlier question/answer pairs sent with each query
+        self.history_turns = history_turns
+        # Chat transcript as shown to the user, as structured step records;
+        # see ChatHistory for max_turns and spill_dir
+        self.history = ChatHistory(max_turns, spill_dir)
+        # The last history_turns (query, final answer) pairs
+        self.turns = []
+        # Results of this conversation's tool calls, so repeats do not run again
+        self.memo = ToolMemo()
+
+    def _history(self) -> List[Dict[str, Any]]:
+        history = []
+        for query, answer in self.turns:
+            history.append({"role": "user", "content": query})
+            history.append({"role": "assistant", "content": answer})
+        return history
+
+    def _record(self, query: str, event: AgentEvent) -> None:
+        step = step_from_event(event)
+        # The question is already the turn's query
+        if step is not None and step["type"] != "question":
+            self.history.add_step(step)
+        if event.type in ("answer", "error"):
+            self.history.end_turn()
+        if event.type == "answer" and self.history_turns > 0:
+            self.turns.append((query, event.content))
+            del self.turns[:-self.history_turns]
+
+    async def astream(self, query: str, plan: Optional[str] = None, cache: str = "use") -> AsyncIterator[AgentEvent]:
+        """Run a query in this conversation, yielding the agent's events"""
+        self.history.start_turn(query)
+        async for event in self.agent.astream(query, plan, self._history(), cache=cache, memo=self.memo):
+            self._record(query, event)
+            yield event
+
+    def stream(self, query: str, plan: Optional[str] = None, cache: str = "use") -> Iterator[AgentEvent]:
+        """Blocking astream; the agent must be an Agent"""
+        self.history.start_turn(query)
+        for event in self.agent.stream(query, plan, self._history(), cache, memo=self.memo):
+            self._record(query, event)
+            yield event
+
+    def clear(self) -> None:
+        self.history.clear()
+        self.turns = []
+        self.memo.clear()
@@ -1,11 +1,20 @@
 import os
+import tempfile
 import streamlit as st
 from dotenv import load_dotenv
-from agent import Agent
+from agent import Agent, Conversation, format_event
+from history import format_step
 
 # Load environment variables
 load_dotenv()
 
+# Latest turns rendered with all their steps; older ones show only the answer
+RECENT_TURNS = 3
+# Turns shown per "Show earlier messages" page
+PAGE_SIZE = 10
+# Turns kept in memory per session; older ones are spilled to a temp file
+MAX_TURNS_IN_MEMORY = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "50"))
+
 # Page config
 st.set_page_config(
     page_title="Simple Agent",
@@ -13,16 +22,57 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize session state for chat history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
 
-if "agent" not in st.session_state:
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        st.error("Please set OPENAI_API_KEY in your .env file")
-        st.stop()
-    st.session_state.agent = Agent(openai_api_key=openai_api_key)
+@st.cache_resource
+def get_agent(openai_api_key: str) -> Agent:
+    """
+    One agent for the whole process: every session shares its OpenAI client
+    (and keep-alive connections), tools, caches and thread pools
+    """
+    return Agent(openai_api_key=openai_api_key, plan="auto")
+
+
+openai_api_key = os.getenv("OPENAI_API_KEY")
+if not openai_api_key:
+    st.error("Please set OPENAI_API_KEY in your .env file")
+    st.stop()
+
+# Each browser session only keeps its own conversation history
+if "conversation" not in st.session_state:
+    st.session_state.conversation = Conversation(
+        get_agent(openai_api_key),
+        max_turns=MAX_TURNS_IN_MEMORY,
+        spill_dir=tempfile.gettempdir()
+    )
+    st.session_state.shown_turns = PAGE_SIZE
+conversation = st.session_state.conversation
+history = conversation.history
+
+
+def render_steps(steps):
+    for step in steps:
+        if step["type"] == "error":
+            st.error(format_step(step))
+        else:
+            st.markdown(format_step(step))
+
+
+def render_turn(number, turn, expanded):
+    with st.chat_message("user"):
+        st.markdown(turn["query"])
+    with st.chat_message("assistant"):
+        if expanded:
+            render_steps(turn["steps"])
+            return
+        if turn["error"] is not None:
+            st.error(f"Error: {turn['error']}")
+        else:
+            st.markdown(turn["answer"] or "")
+        # Tool details are only rendered when asked for, so older turns cost
+        # the same on every rerun however large their results were
+        details = [step for step in turn["steps"] if step["type"] != "answer"]
+        if details and st.toggle(f"Show {len(details)} steps", key=f"steps-{number}"):
+            render_steps(details)
 
 # App title
 st.title("🤖 Simple Agent")
@@ -32,23 +82,43 @@ This is a ReAct-based agent that can help you with:
 - Performing mathematical calculations
 """)
 
-# Chat interface
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+# Chat interface: only the latest pages of history are rendered
+first = max(len(history) - st.session_state.shown_turns, history.first)
+if first > history.first and st.button("Show earlier messages"):
+    st.session_state.shown_turns += PAGE_SIZE
+    st.rerun()
+for number, turn in enumerate(history.turns(first), first):
+    render_turn(number, turn, expanded=number >= len(history) - RECENT_TURNS)
 
 if prompt := st.chat_input("What would you like to know?"):
-    # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    # The conversation records the turn as its events arrive
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Get agent response
+    # Stream the agent response, rendering each step as it arrives
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = st.session_state.agent.run(prompt)
-            st.markdown(response)
-            st.session_state.messages.append({"role": "assistant", "content": response})
+        live = st.empty()
+        tokens = ""
+        running = {}
+        for event in conversation.stream(prompt):
+            if event.type in ("plan_token", "answer_token"):
+                tokens += event.content
+                live.markdown(tokens)
+            elif event.type == "tool_start":
+                running[event.data["id"]] = f"🔧 Running **{event.data['name']}**..."
+                live.markdown("\n\n".join(running.values()))
+            elif event.type == "error":
+                live.error(f"Error: {event.content}")
+            else:
+                step = format_event(event)
+                if step:
+                    # Freeze the finished step and start a new live area below it
+                    live.markdown(step)
+                    live = st.empty()
+                if event.type == "tool_result":
+                    running.pop(event.data["id"], None)
+                    live.markdown("\n\n".join(running.values()))
+                tokens = ""
 
 # Sidebar
 with st.sidebar:
@@ -63,5 +133,6 @@ with st.sidebar:
     
     # Clear chat button
     if st.button("Clear Chat"):
-        st.session_state.messages = []
+        conversation.clear()
+        st.session_state.shown_turns = PAGE_SIZE
         st.rerun() 
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Run the agent over a JSONL file of queries.
+
+Each input line is {"query": "...", "id": ...} ("id" defaults to the line
+number). Results are appended to the output JSONL as they finish, so an
+interrupted run picks up where it stopped when started again; queries that
+failed are run again.
+
+Usage:
+    python src/batch.py queries.jsonl -o results.jsonl --concurrency 8
+"""
+from typing import Dict, Any, Iterator, Optional, Set
+import argparse
+import asyncio
+import json
+import os
+import time
+from dotenv import load_dotenv
+from agent import AsyncAgent
+from planning import PLAN_MODES
+
+
+def read_queries(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream query records from a JSONL file"""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "query" not in record:
+                raise ValueError(f"{path}:{line_number}: record has no 'query'")
+            yield {"id": record.get("id", line_number), "query": record["query"]}
+
+
+def completed_ids(path: str) -> Set[str]:
+    """
+    Return the ids already answered in an output file. Failed results and a
+    partial last line left by a crash are removed from the file, so failed
+    queries run again and new results start on a fresh line.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb") as f:
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    records = [json.loads(line) for line in data[:end].decode("utf-8").splitlines() if line.strip()]
+    answered = [record for record in records if not record.get("error")]
+    if end < len(data) or len(answered) < len(records):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in answered)
+        os.replace(temp_path, path)
+    return {str(record["id"]) for record in answered}
+
+
+async def run_query(agent: AsyncAgent, record: Dict[str, Any], plan: Optional[str] = None) -> Dict[str, Any]:
+    """Run one query and return its result record"""
+    started = time.perf_counter()
+    answer = None
+    error = None
+    usage = {}
+    # Every query is answered afresh, even by an agent that caches answers
+    async for event in agent.astream(record["query"], plan, cache="bypass"):
+        if event.type == "answer":
+            answer = event.content
+            usage = event.data["usage"]
+        elif event.type == "error":
+            error = event.content
+            usage = event.data["usage"]
+    return {
+        "id": record["id"],
+        "query": record["query"],
+        "answer": answer,
+        "error": error,
+        "latency": round(time.perf_counter() - started, 3),
+        **usage
+    }
+
+
+async def run_batch(
+    agent: AsyncAgent,
+    input_path: str,
+    output_path: str,
+    concurrency: int = 8,
+    plan: Optional[str] = None
+) -> Dict[str, Any]:
+    """Run every query not yet in the output file, concurrency at a time"""
+    done = completed_ids(output_path)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker():
+            while True:
+                record = await queue.get()
+                if record is None:
+                    return
+                result = await run_query(agent, record, plan)
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                counts["failed" if result["error"] else "completed"] += 1
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            for record in read_queries(input_path):
+                if str(record["id"]) in done:
+                    counts["skipped"] += 1
+                    continue
+                await queue.put(record)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    elapsed = time.perf_counter() - started
+    finished = counts["completed"] + counts["failed"]
+    return {
+        **counts,
+        "elapsed": round(elapsed, 3),
+        "throughput": round(finished / elapsed, 3) if elapsed else 0.0
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the agent over a JSONL file of queries")
+    parser.add_argument("input", help="JSONL file of {\"query\": ..., \"id\": ...} records")
+    parser.add_argument("-o", "--output", help="Output JSONL file (default: <input>.results.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Concurrent conversations")
+    parser.add_argument("--plan", choices=PLAN_MODES, default="auto", help="Planning mode")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        parser.error("Please set OPENAI_API_KEY in your .env file")
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    agent = AsyncAgent(openai_api_key=openai_api_key, plan=args.plan)
+    summary = asyncio.run(run_batch(agent, args.input, output, args.concurrency))
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
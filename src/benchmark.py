@@ -0,0 +1,327 @@
+"""
+Offline benchmark of the agent loop.
+
+Runs scripted conversations against a fake chat-completions client and stub
+tools, so the overhead of the agent itself can be measured without OpenAI,
+SerpAPI or Wikipedia access.
+
+Usage:
+    python src/benchmark.py --sessions 200 --concurrency 50 --llm-latency 0.05
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from types import SimpleNamespace
+import argparse
+import asyncio
+import json
+import re
+import time
+import tracemalloc
+from agent import AsyncAgent
+from context import ContextManager, TokenCounter
+from tracing import Tracer
+
+# Scripted conversations. Each round is either a list of (tool, arguments)
+# calls or the final answer text.
+SCENARIOS = {
+    "single_tool": [
+        [("calculator", {"expression": "2 + 2 * 5"})],
+        "The result is 12."
+    ],
+    "multi_round": [
+        [("wikipedia", {"action": "search", "query": "quantum computing"})],
+        [("wikipedia", {"action": "read", "query": "Quantum computing"})],
+        [("google_search", {"query": "quantum computing news"})],
+        "Quantum computing uses qubits."
+    ],
+    "parallel_tools": [
+        [
+            ("google_search", {"query": "population of France"}),
+            ("google_search", {"query": "population of Germany"}),
+            ("google_search", {"query": "population of Italy"}),
+            ("wikipedia", {"action": "read", "query": "Europe"})
+        ],
+        "France, Germany and Italy together have about 210 million people."
+    ]
+}
+
+# Tools replaced by stubs with a configurable latency
+STUBBED_TOOLS = ("google_search", "wikipedia")
+
+PLAN = "PLAN:\n1. Use the right tool\n2. Answer\nREASONING: Scripted plan"
+SCENARIO_TAG = re.compile(r"\[(\w+)#-?\d+\]")
+
+
+def _chunk(content: Optional[str] = None, tool_calls=None, usage=None) -> SimpleNamespace:
+    if usage is not None:
+        return SimpleNamespace(choices=[], usage=usage)
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+class _ChunkStream:
+    def __init__(self, chunks: List[SimpleNamespace]):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class ScriptedCompletions:
+    """
+    Stand-in for client.chat.completions that replays SCENARIOS. The scenario
+    is read from the "[name#n]" tag in the user query and the round from the
+    number of assistant messages, so concurrent sessions need no shared state.
+    The time each call spends "serving" is recorded per tag in served.
+    """
+
+    def __init__(self, latency: float = 0.0, tokens_per_chunk: int = 4):
+        self.latency = latency
+        self.tokens_per_chunk = tokens_per_chunk
+        self.served: Dict[str, List[Tuple[float, float]]] = {}
+
+    def _text_chunks(self, text: str) -> List[SimpleNamespace]:
+        words = text.split(" ")
+        return [
+            _chunk(content=" ".join(words[i:i + self.tokens_per_chunk]) + " ")
+            for i in range(0, len(words), self.tokens_per_chunk)
+        ]
+
+    async def create(self, messages: List[Dict[str, Any]], tools=None, **kwargs) -> _ChunkStream:
+        session = next(
+            match.group(0) for message in messages
+            if message["role"] == "user" and (match := SCENARIO_TAG.search(message["content"]))
+        )
+        started = time.time()
+        await asyncio.sleep(self.latency)
+        self.served.setdefault(session, []).append((started, time.time()))
+        prompt_tokens = sum(len(message.get("content") or "") for message in messages) // 4
+        if tools is None:
+            chunks = self._text_chunks(PLAN)
+        else:
+            script = SCENARIOS[SCENARIO_TAG.match(session).group(1)]
+            step = script[min(sum(message["role"] == "assistant" for message in messages), len(script) - 1)]
+            if isinstance(step, str):
+                chunks = self._text_chunks(step)
+            else:
+                chunks = [
+                    _chunk(tool_calls=[SimpleNamespace(
+                        index=index,
+                        id=f"call_{index}",
+                        function=SimpleNamespace(name=name, arguments=json.dumps(args))
+                    )])
+                    for index, (name, args) in enumerate(step)
+                ]
+        chunks.append(_chunk(usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(chunks))))
+        return _ChunkStream(chunks)
+
+
+class StubSearchTool:
+    """Deterministic stand-in for GoogleSearchTool"""
+    name = "google_search"
+    description = "Search the internet for information"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def run(self, query: str) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return {
+            "success": True,
+            "result": [
+                {"title": f"{query} - result {i}", "snippet": f"Snippet {i} about {query}.", "url": f"https://example.com/{i}"}
+                for i in range(3)
+            ]
+        }
+
+
+class StubWikipediaTool:
+    """Deterministic stand-in for WikipediaTool"""
+    name = "wikipedia"
+    description = "Search Wikipedia articles and read their content"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def run(self, query: str) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        action, _, term = query.partition(":")
+        if action == "search":
+            # The best match first, as the scripted reads expect
+            return {"success": True, "result": [term.capitalize()] + [f"{term} {i}" for i in range(4)]}
+        return {
+            "success": True,
+            "result": {"title": term, "summary": f"{term} is a scripted article. " * 5, "url": f"https://en.wikipedia.org/wiki/{term}"}
+        }
+
+
+class SpanCollector:
+    """Trace exporter keeping each finished run's spans until they are taken"""
+
+    def __init__(self):
+        self.traces: Dict[str, List[Any]] = {}
+
+    def export(self, spans) -> None:
+        self.traces[spans[0].trace_id] = spans
+
+
+def build_agent(llm_latency: float, tool_latency: float, plan: str, cache: bool, prefetch: bool = False):
+    """AsyncAgent wired to the scripted client and stub tools"""
+    agent = AsyncAgent(
+        openai_api_key="offline-benchmark",
+        plan=plan,
+        cache_tool_results=cache,
+        prefetch=prefetch,
+        # Every session would otherwise repeat the warm-up's cached answer
+        cache_answers=False,
+        tracer=Tracer([SpanCollector()]),
+        # Estimated token counts, so the benchmark never downloads an encoding
+        context_manager=ContextManager(counter=TokenCounter(encoding=None)),
+        tool_instances={
+            "google_search": StubSearchTool(tool_latency),
+            "wikipedia": StubWikipediaTool(tool_latency)
+        }
+    )
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=ScriptedCompletions(llm_latency)))
+    return agent
+
+
+def _covered(intervals: List[Tuple[float, float]]) -> float:
+    """Total time covered by possibly overlapping intervals"""
+    total = 0.0
+    end = float("-inf")
+    for start, stop in sorted(intervals):
+        if stop > end:
+            total += stop - max(start, end)
+            end = stop
+    return total
+
+
+async def run_session(agent, scenario: str, session: int) -> Dict[str, Any]:
+    """
+    Run one scripted session. "scripted" is the time on its critical path
+    spent in the scripted client and stub tools: the union of the client's
+    serving intervals and the spans of tool calls that ran (or waited for a
+    prefetch), so overlapping planning, cache hits and prefetches count only
+    for the time they actually held the run up.
+    """
+    tag = f"[{scenario}#{session}]"
+    started = time.perf_counter()
+    usage = {}
+    trace_id = None
+    async for event in agent.astream(f"{tag} Scripted question"):
+        if event.type == "error":
+            raise RuntimeError(event.content)
+        if event.type == "answer":
+            usage = event.data["usage"]
+            trace_id = event.data["trace"]["trace_id"]
+    latency = time.perf_counter() - started
+    spans = agent.tracer.exporters[0].traces.pop(trace_id, [])
+    intervals = agent.client.chat.completions.served.pop(tag, [])
+    intervals += [
+        (span.start, span.end) for span in spans
+        if span.kind == "tool" and span.name in STUBBED_TOOLS and not span.attributes.get("cached")
+    ]
+    return {"latency": latency, "scripted": _covered(intervals), **usage}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def measure_memory(agent, scenario: str) -> Dict[str, float]:
+    """
+    Memory of one session, via tracemalloc: the blocks it left allocated
+    (cache entries, history, leaks) and the peak of the memory it traced
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        await run_session(agent, scenario, -1)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    return {
+        "retained_blocks_per_session": sum(stat.count_diff for stat in diff),
+        "peak_kib_per_session": peak / 1024
+    }
+
+
+async def run_scenario(agent, scenario: str, sessions: int, concurrency: int) -> Dict[str, Any]:
+    """Run sessions of one scenario, concurrency at a time, and summarize them"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(session: int):
+        async with semaphore:
+            return await run_session(agent, scenario, session)
+
+    await run_session(agent, scenario, -1)  # Warm up
+    started = time.perf_counter()
+    results = await asyncio.gather(*(limited(session) for session in range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [result["latency"] for result in results]
+    # Time the scripted client and tools account for; the rest is overhead
+    overheads = [result["latency"] - result["scripted"] for result in results]
+    return {
+        "scenario": scenario,
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "overhead_p50_ms": percentile(overheads, 0.5) * 1000,
+        "overhead_p95_ms": percentile(overheads, 0.95) * 1000,
+        "throughput_per_s": sessions / elapsed,
+        **await measure_memory(agent, scenario)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the agent loop")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--sessions", type=int, default=100, help="Sessions per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent sessions")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per scripted LLM call")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="Seconds per stub tool call")
+    parser.add_argument("--plan", default="off", help="Agent planning mode")
+    parser.add_argument("--cache", action="store_true", help="Enable the tool result cache")
+    parser.add_argument("--prefetch", action="store_true", help="Prefetch likely Wikipedia reads")
+    parser.add_argument("--json", action="store_true", help="Print one JSON report per line")
+    args = parser.parse_args(argv)
+
+    scenarios = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+
+    async def run_all():
+        agent = build_agent(args.llm_latency, args.tool_latency, args.plan, args.cache, args.prefetch)
+        return [
+            await run_scenario(agent, scenario, args.sessions, args.concurrency)
+            for scenario in scenarios
+        ]
+
+    reports = asyncio.run(run_all())
+    if args.json:
+        for report in reports:
+            print(json.dumps(report))
+        return
+
+    columns = ["scenario", "p50_ms", "p95_ms", "overhead_p50_ms", "overhead_p95_ms",
+               "throughput_per_s", "retained_blocks_per_session", "peak_kib_per_session"]
+    print("  ".join(f"{column:>16}" for column in columns))
+    for report in reports:
+        print("  ".join(
+            f"{report[column]:>16.2f}" if isinstance(report[column], float) else f"{report[column]:>16}"
+            for column in columns
+        ))
+
+
+if __name__ == "__main__":
+    main()
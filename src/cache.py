@@ -0,0 +1,319 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# Seconds a cached result stays fresh, per tool. None means it never expires.
+# Calculator results are pure; search results go stale quickly.
+DEFAULT_TOOL_TTLS = {
+    "calculator": None,
+    "google_search": 3600,
+    "wikipedia": 86400
+}
+
+# Seconds a cached final answer stays fresh, per tool the answer used; an
+# answer gets the shortest TTL of its tools. Answers that only used the
+# calculator never expire; answers about today's date or the news go stale
+# quickly. Answers given without any tool get NO_TOOLS_ANSWER_TTL.
+DEFAULT_ANSWER_TTLS = {
+    "calculator": None,
+    "datetime": 60,
+    "google_search": 300,
+    "wikipedia": 86400
+}
+
+# An answer given without tools may still depend on the current time ("what's
+# today's date?"), so it is kept no longer than a datetime answer
+NO_TOOLS_ANSWER_TTL = 60
+
+# Per-request answer cache modes: "use" reads and writes the cache, "refresh"
+# recomputes the answer and overwrites the entry, "bypass" ignores the cache
+ANSWER_CACHE_MODES = ("use", "refresh", "bypass")
+
+# Sentence punctuation ending a question. A "!" after a number or ")" is a
+# factorial and is kept; punctuation inside the question ("10:30", "1,000")
+# is kept too. Quotes and apostrophes are removed outright so "what's"
+# matches "whats".
+_TRAILING_PUNCTUATION = re.compile(r"(?:\s|[?.]|(?<![\d)])!)+$")
+_QUERY_QUOTES = re.compile(r"[\"'`\u2018\u2019\u201c\u201d]")
+_SPACE_AROUND_SYMBOLS = re.compile(r"\s*([^\w\s])\s*")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a question for answer caching: case-folded, without
+    its closing punctuation and with whitespace collapsed. Operators and
+    other punctuation are kept, so different calculations never collide.
+    """
+    text = _QUERY_QUOTES.sub("", query.casefold())
+    text = " ".join(_TRAILING_PUNCTUATION.sub("", text).split())
+    return _SPACE_AROUND_SYMBOLS.sub(r"\1", text)
+
+
+class MemoryCacheBackend:
+    """In-process LRU store bounded by number of entries"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """Return (value, expires_at) for a key, marking it recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: str, expires_at: Optional[float]) -> None:
+        """Store a value, evicting the least recently used entries if full"""
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk LRU store in a SQLite file, shared across processes and restarts"""
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """Return (value, expires_at) for a key, marking it recently used"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE cache SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+                self._conn.commit()
+            return row
+
+    def set(self, key: str, value: str, expires_at: Optional[float]) -> None:
+        """Store a value, evicting the least recently used entries if full"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ToolCache:
+    """
+    Cache of successful tool results keyed on tool name and normalized
+    arguments, with a TTL per tool and hit/miss counters
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        ttls: Optional[Dict[str, Optional[float]]] = None,
+        default_ttl: Optional[float] = 3600
+    ):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttls = dict(DEFAULT_TOOL_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tool_name: str, tool_args: Dict[str, Any]) -> str:
+        """Build a cache key, collapsing whitespace in string arguments"""
+        normalized = {
+            name: " ".join(value.split()) if isinstance(value, str) else value
+            for name, value in tool_args.items()
+        }
+        return f"{tool_name}:{json.dumps(normalized, sort_keys=True, separators=(',', ':'))}"
+
+    def ttl(self, tool_name: str) -> Optional[float]:
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def get(self, tool_name: str, tool_args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a tool call, or None on a miss"""
+        key = self.make_key(tool_name, tool_args)
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            self.backend.delete(key)
+            entry = None
+        with self._lock:
+            counter = self.hits if entry is not None else self.misses
+            counter[tool_name] = counter.get(tool_name, 0) + 1
+        return json.loads(entry[0]) if entry is not None else None
+
+    def set(self, tool_name: str, tool_args: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Store a tool result unless its TTL disables caching"""
+        ttl = self.ttl(tool_name)
+        if ttl is not None and ttl <= 0:
+            return
+        expires_at = time.time() + ttl if ttl is not None else None
+        self.backend.set(self.make_key(tool_name, tool_args), json.dumps(result), expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters overall and per tool"""
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "entries": len(self.backend),
+                "per_tool": {
+                    name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)}
+                    for name in sorted(set(self.hits) | set(self.misses))
+                }
+            }
+
+
+class AnswerCache:
+    """
+    Cache of final answers keyed on the normalized query. Each entry's TTL
+    depends on the tools used to produce it (see DEFAULT_ANSWER_TTLS).
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        ttls: Optional[Dict[str, Optional[float]]] = None,
+        default_ttl: Optional[float] = 3600,
+        no_tools_ttl: Optional[float] = NO_TOOLS_ANSWER_TTL
+    ):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttls = dict(DEFAULT_ANSWER_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        # TTL of answers using tools not listed in ttls
+        self.default_ttl = default_ttl
+        # TTL of answers given without tools
+        self.no_tools_ttl = no_tools_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str) -> str:
+        return f"answer:{normalize_query(query)}"
+
+    def ttl(self, tools_used: List[str]) -> Optional[float]:
+        """The shortest TTL of the tools used; None means never expire"""
+        if not tools_used:
+            return self.no_tools_ttl
+        ttls = [self.ttls.get(name, self.default_ttl) for name in set(tools_used)]
+        finite = [ttl for ttl in ttls if ttl is not None]
+        return min(finite) if finite else None
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return the cached {"answer", "tools"} for a query, or None on a miss"""
+        key = self.make_key(query)
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            self.backend.delete(key)
+            entry = None
+        with self._lock:
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(entry[0]) if entry is not None else None
+
+    def set(self, query: str, answer: str, tools_used: List[str]) -> None:
+        """Store a final answer unless the TTL of its tools disables caching"""
+        ttl = self.ttl(tools_used)
+        if ttl is not None and ttl <= 0:
+            return
+        expires_at = time.time() + ttl if ttl is not None else None
+        value = json.dumps({"answer": answer, "tools": sorted(set(tools_used))})
+        self.backend.set(self.make_key(query), value, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.backend)
+            }
+
+
+class ToolMemo:
+    """
+    Results of the tool calls made in one conversation, so a call the model
+    repeats is answered without running the tool again. Unlike ToolCache it
+    has no TTL: it lives only as long as the conversation.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return result
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        """Whether a call's result is held, without counting a hit"""
+        with self._lock:
+            return key in self._entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,220 @@
+from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+# Compaction strategies, always applied in this order while a round is over
+# budget:
+# - "truncate_tool_outputs": cut long tool results from earlier rounds
+# - "drop_plan": remove the plan once the model has acted on it
+# - "summarize_rounds": collapse earlier rounds into a one-line digest each
+STRATEGIES = ("truncate_tool_outputs", "drop_plan", "summarize_rounds")
+
+# Approximate tokens of per-message framing in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+CHARS_PER_TOKEN = 4
+
+
+# Placeholder for a tiktoken encoding that has not been loaded yet
+_NOT_LOADED = object()
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken when it is installed, else estimates them.
+    The encoding is loaded on first use (tiktoken downloads it the first
+    time), and the estimate is used if it cannot be loaded; encoding=None
+    always estimates. Counts are cached by text, so the messages carried
+    from round to round are only tokenized once.
+    """
+
+    def __init__(self, encoding: Optional[str] = "o200k_base", cache_size: int = 4096):
+        self.encoding_name = encoding
+        self._encoding = _NOT_LOADED if tiktoken is not None and encoding is not None else None
+        self._lock = threading.Lock()
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @property
+    def encoding(self):
+        """The tiktoken encoding, or None when tokens are estimated"""
+        if self._encoding is _NOT_LOADED:
+            with self._lock:
+                if self._encoding is _NOT_LOADED:
+                    try:
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception:  # e.g. no network to download it
+                        self._encoding = None
+        return self._encoding
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, marking that it was truncated"""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            head = self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+        else:
+            head = text[:max_tokens * CHARS_PER_TOKEN]
+        return f"{head} …[truncated]"
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.count(message.get("content") or "")
+        for tool_call in message.get("tool_calls") or []:
+            tokens += self.count(tool_call["function"]["name"]) + self.count(tool_call["function"]["arguments"])
+        return tokens
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+
+class ContextManager:
+    """
+    Keeps the prompt sent on each round of the ReAct loop within a token
+    budget. The agent keeps the full history; prepare() returns a compacted
+    copy for the next request and a report of the tokens it saved.
+    """
+
+    def __init__(
+        self,
+        budget: int = 8000,
+        strategies: Tuple[str, ...] = STRATEGIES,
+        keep_recent_rounds: int = 1,
+        max_tool_output_tokens: int = 300,
+        summary_tokens: int = 40,
+        counter: Optional[TokenCounter] = None
+    ):
+        unknown = set(strategies) - set(STRATEGIES)
+        if unknown:
+            raise ValueError(f"Unknown compaction strategies: {sorted(unknown)}")
+        self.budget = budget
+        self.strategies = strategies
+        self.keep_recent_rounds = keep_recent_rounds
+        self.max_tool_output_tokens = max_tool_output_tokens
+        self.summary_tokens = summary_tokens
+        self.counter = counter or TokenCounter()
+        self.rounds = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _round_starts(messages: List[Dict[str, Any]]) -> List[int]:
+        """Indices of the assistant messages that open each tool round"""
+        return [
+            index for index, message in enumerate(messages)
+            if message["role"] == "assistant" and message.get("tool_calls")
+        ]
+
+    def _old_round_messages(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """Indices of messages in rounds older than the ones kept verbatim"""
+        starts = self._round_starts(messages)
+        if len(starts) <= self.keep_recent_rounds:
+            return []
+        end = starts[-self.keep_recent_rounds] if self.keep_recent_rounds else len(messages)
+        return list(range(starts[0], end))
+
+    def _truncate_tool_outputs(self, messages: List[Dict[str, Any]], **_) -> List[Dict[str, Any]]:
+        old = set(self._old_round_messages(messages))
+        compacted = list(messages)
+        truncated = False
+        for index in old:
+            message = messages[index]
+            if message["role"] != "tool":
+                continue
+            content = self.counter.truncate(message["content"], self.max_tool_output_tokens)
+            if content != message["content"]:
+                compacted[index] = {**message, "content": content}
+                truncated = True
+        return compacted if truncated else messages
+
+    def _drop_plan(
+        self,
+        messages: List[Dict[str, Any]],
+        plan_index: Optional[int] = None,
+        plan_replacement: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        # The plan has been used once a tool round follows it
+        if plan_index is None or not any(start > plan_index for start in self._round_starts(messages)):
+            return messages
+        compacted = list(messages)
+        if plan_replacement is None:
+            del compacted[plan_index]
+        else:
+            compacted[plan_index] = {**messages[plan_index], "content": plan_replacement}
+        return compacted
+
+    def _summarize_rounds(self, messages: List[Dict[str, Any]], **_) -> List[Dict[str, Any]]:
+        old = self._old_round_messages(messages)
+        if not old:
+            return messages
+        results = {
+            message["tool_call_id"]: message["content"]
+            for message in messages if message["role"] == "tool"
+        }
+        compacted = []
+        for index, message in enumerate(messages):
+            if index not in old:
+                compacted.append(message)
+            elif message["role"] == "assistant" and message.get("tool_calls"):
+                # Replace the round with a digest of its calls and results
+                lines = [
+                    f"- {tool_call['function']['name']}({tool_call['function']['arguments']}) -> "
+                    + self.counter.truncate(results.get(tool_call["id"], ""), self.summary_tokens)
+                    for tool_call in message["tool_calls"]
+                ]
+                compacted.append({"role": "assistant", "content": "Earlier step results:\n" + "\n".join(lines)})
+            elif message["role"] != "tool":
+                compacted.append(message)
+        return compacted
+
+    def prepare(
+        self,
+        messages: List[Dict[str, Any]],
+        plan_index: Optional[int] = None,
+        plan_replacement: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Compact messages for the next request. plan_index is the message that
+        carries the plan; once it has been used, drop_plan replaces its content
+        with plan_replacement, or removes it when that is None.
+        Returns (messages, report).
+        """
+        tokens_before = self.counter.count_messages(messages)
+        tokens = tokens_before
+        applied = []
+        compacted = messages
+        for strategy in STRATEGIES:
+            if strategy not in self.strategies:
+                continue
+            if tokens <= self.budget:
+                break
+            candidate = getattr(self, f"_{strategy}")(
+                compacted, plan_index=plan_index, plan_replacement=plan_replacement
+            )
+            if candidate is not compacted:
+                compacted = candidate
+                tokens = self.counter.count_messages(compacted)
+                applied.append(strategy)
+                # Later strategies no longer know where the plan is
+                if strategy == "drop_plan":
+                    plan_index = None
+
+        with self._lock:
+            self.rounds += 1
+            self.tokens_saved += tokens_before - tokens
+        return compacted, {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens,
+            "tokens_saved": tokens_before - tokens,
+            "budget": self.budget,
+            "strategies": applied
+        }
@@ -0,0 +1,144 @@
+from typing import Dict, Any, List, Optional
+import json
+import os
+import tempfile
+import weakref
+
+
+def step_from_event(event) -> Optional[Dict[str, Any]]:
+    """The step record of a completed step event, or None for partial events"""
+    if event.type == "start":
+        return {"type": "question", "content": event.data["query"]}
+    if event.type == "plan":
+        return None if event.data["skipped"] else {"type": "plan", "content": event.content}
+    if event.type == "tool_result":
+        return {
+            "type": "tool",
+            "name": event.data["name"],
+            "thought": event.data["thought"],
+            "args": event.data["args"],
+            "result": event.content,
+            "success": event.data["success"]
+        }
+    if event.type == "answer":
+        return {"type": "answer", "content": event.content} if event.content else None
+    if event.type == "error":
+        return {"type": "error", "content": event.content}
+    return None
+
+
+def format_step(step: Dict[str, Any]) -> str:
+    """Render a step record as markdown"""
+    if step["type"] == "question":
+        return f"🤔 **Question:** {step['content']}"
+    if step["type"] == "plan":
+        return f"📋 **Planning Phase:**\n{step['content']}"
+    if step["type"] == "tool":
+        # Calls whose arguments could not be parsed only have an error message
+        if step["args"] is None:
+            return step["result"]
+        thought = step["thought"] or "Using tool to find information"
+        return "\n\n".join([
+            "---",
+            f"💭 **Executing Plan Step:** {thought}",
+            f"🔧 **Tool:** {step['name']}",
+            f"📥 **Input:** {json.dumps(step['args'], indent=2)}",
+            f"📝 **Result:** {step['result']}"
+        ])
+    if step["type"] == "answer":
+        return f"---\n\n✨ **Final Answer:** {step['content']}"
+    return f"Error: {step['content']}"
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ChatHistory:
+    """
+    A conversation's transcript as structured turns:
+    {"query", "steps": [step records], "answer", "error"}.
+
+    At most max_turns turns are kept in memory. Older turns are appended to
+    a JSONL file in spill_dir (created on first use, removed with the
+    history) and read back by offset when an earlier page is shown; without
+    a spill_dir they are dropped. max_turns=None keeps everything in memory.
+    """
+
+    def __init__(self, max_turns: Optional[int] = None, spill_dir: Optional[str] = None):
+        self.max_turns = max_turns
+        self.spill_dir = spill_dir
+        self._turns: List[Dict[str, Any]] = []
+        # Turns that left memory: offsets of those on disk, count of dropped ones
+        self._offsets: List[int] = []
+        self._dropped = 0
+        self._spill_path = None
+        self._finalizer = None
+
+    def __len__(self) -> int:
+        return self._dropped + len(self._offsets) + len(self._turns)
+
+    @property
+    def first(self) -> int:
+        """Number of the oldest turn still available"""
+        return self._dropped
+
+    def start_turn(self, query: str) -> Dict[str, Any]:
+        turn = {"query": query, "steps": [], "answer": None, "error": None}
+        self._turns.append(turn)
+        return turn
+
+    def add_step(self, step: Dict[str, Any]) -> None:
+        """Add a step record to the current turn"""
+        turn = self._turns[-1]
+        turn["steps"].append(step)
+        if step["type"] == "answer":
+            turn["answer"] = step["content"]
+        elif step["type"] == "error":
+            turn["error"] = step["content"]
+
+    def end_turn(self) -> None:
+        """Close the current turn, moving the oldest out of memory if over max_turns"""
+        if self.max_turns is None:
+            return
+        overflow = len(self._turns) - self.max_turns
+        if overflow <= 0:
+            return
+        spilled, self._turns = self._turns[:overflow], self._turns[overflow:]
+        if self.spill_dir is None:
+            self._dropped += len(spilled)
+            return
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix="chat-", suffix=".jsonl", dir=self.spill_dir)
+            os.close(fd)
+            self._finalizer = weakref.finalize(self, _remove, self._spill_path)
+        with open(self._spill_path, "ab") as f:
+            for turn in spilled:
+                self._offsets.append(f.tell())
+                f.write(json.dumps(turn, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def turns(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Turns start..stop (by turn number, oldest first), reading spilled ones from disk"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(start, self._dropped)
+        on_disk = self._dropped + len(self._offsets)
+        turns = []
+        if start < on_disk:
+            with open(self._spill_path, "rb") as f:
+                for number in range(start, min(stop, on_disk)):
+                    f.seek(self._offsets[number - self._dropped])
+                    turns.append(json.loads(f.readline()))
+        turns.extend(self._turns[max(start - on_disk, 0):max(stop - on_disk, 0)])
+        return turns
+
+    def clear(self) -> None:
+        self._turns = []
+        self._offsets = []
+        self._dropped = 0
+        if self._finalizer is not None:
+            self._finalizer()
+        self._spill_path = None
+        self._finalizer = None
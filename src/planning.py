@@ -0,0 +1,83 @@
+from typing import Dict, Any
+import re
+import threading
+
+# How the agent plans before its first tool-selection call:
+# - "on": always create a plan first (two serialized LLM calls)
+# - "off": never plan
+# - "auto": skip the plan for simple queries such as arithmetic or dates
+# - "parallel": create the plan alongside the first tool-selection call and
+#   hand it to the model from the second round on
+PLAN_MODES = ("on", "off", "auto", "parallel")
+
+# Words that may appear in a pure arithmetic query besides numbers/operators
+ARITHMETIC_WORDS = {
+    "what", "is", "whats", "calculate", "compute", "evaluate", "math",
+    "sqrt", "pow", "abs", "round", "pi", "e", "log", "exp", "sin", "cos", "tan",
+    "plus", "minus", "times", "divided", "by", "squared", "of"
+}
+# An arithmetic query must apply an operator; a bare number ("1984") is not one
+OPERATOR_PATTERN = re.compile(
+    r"[-+*/^%]|\b(plus|minus|times|divided|squared|sqrt|pow|abs|round|log|exp|sin|cos|tan)\b"
+)
+# Date arithmetic the datetime tool answers on its own. Questions that merely
+# mention today or tomorrow ("the weather tomorrow") need other tools.
+DATE_PATTERN = re.compile(
+    r"\bwhat (day|date) (is|was|will be|will) (it|today|tomorrow|yesterday)\b|"
+    r"\b(what is|what's|whats) (the date|today'?s date)\b|"
+    r"\bday of the week\b|"
+    r"\b\d+ (days?|weeks?) (ago|from now|from today|ahead|later)\b"
+)
+MAX_SIMPLE_DATE_WORDS = 12
+
+
+def is_simple_query(query: str) -> bool:
+    """
+    Cheap heuristic for queries a single tool call answers, so planning
+    would only add latency: pure arithmetic and short date arithmetic
+    """
+    text = query.strip().lower()
+    words = re.findall(r"[a-z]+", text)
+    if re.search(r"\d", text) and OPERATOR_PATTERN.search(text) and all(word in ARITHMETIC_WORDS for word in words):
+        return True
+    return bool(DATE_PATTERN.search(text)) and len(text.split()) <= MAX_SIMPLE_DATE_WORDS
+
+
+class PlanStats:
+    """
+    Per-mode counters of plans created or skipped and the planning latency
+    each mode saved. Skipped plans are credited with the moving average of
+    measured planning latency.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.plan_latency = None
+        self._modes = {}
+        self._lock = threading.Lock()
+
+    def observe_plan(self, latency: float) -> None:
+        """Record how long a completed planning call took"""
+        with self._lock:
+            if self.plan_latency is None:
+                self.plan_latency = latency
+            else:
+                self.plan_latency += self.smoothing * (latency - self.plan_latency)
+
+    def estimated_plan_latency(self) -> float:
+        with self._lock:
+            return self.plan_latency or 0.0
+
+    def record(self, mode: str, skipped: bool, latency_saved: float) -> None:
+        with self._lock:
+            stats = self._modes.setdefault(mode, {"runs": 0, "skipped": 0, "latency_saved": 0.0})
+            stats["runs"] += 1
+            stats["skipped"] += int(skipped)
+            stats["latency_saved"] += latency_saved
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "estimated_plan_latency": self.plan_latency,
+                "modes": {mode: dict(stats) for mode, stats in self._modes.items()}
+            }
@@ -0,0 +1,102 @@
+from typing import Dict, Any, List, Optional, Callable
+from collections import OrderedDict
+from concurrent.futures import Executor
+import threading
+from cache import ToolCache
+
+
+class Prefetcher:
+    """
+    Bounded buffer of speculative tool calls. After a tool returns, the
+    follow-up calls its ToolSpec predicts (e.g. reading the top search
+    results) are started in the background; if the model then makes one of
+    them, its result is taken from the buffer instead of being fetched again.
+    """
+
+    def __init__(self, top_k: int = 2, max_entries: int = 64):
+        self.top_k = top_k
+        self.max_entries = max_entries
+        # key -> (owner, Future of the tool result)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.hits = 0
+        # Prefetches dropped without being used, of which cancelled ones
+        # never ran
+        self.unused = 0
+        self.cancelled = 0
+
+    def schedule(
+        self,
+        tool_name: str,
+        calls: List[Dict[str, Any]],
+        run: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+        executor: Executor,
+        owner: Optional[str] = None
+    ) -> None:
+        """Start up to top_k predicted calls of a tool on the executor"""
+        for tool_args in calls[:self.top_k]:
+            key = ToolCache.make_key(tool_name, tool_args)
+            with self._lock:
+                if key in self._entries:
+                    continue
+                while len(self._entries) >= self.max_entries:
+                    _, (_, oldest) = self._entries.popitem(last=False)
+                    self.unused += 1
+                    self.cancelled += int(oldest.cancel())
+                self._entries[key] = (owner, executor.submit(run, tool_name, tool_args))
+                self.scheduled += 1
+
+    def take(self, tool_name: str, tool_args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return the prefetched result of a call, waiting for it if it is still
+        running, or None if the call was not prefetched (or failed)
+        """
+        key = ToolCache.make_key(tool_name, tool_args)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        future = entry[1]
+        # A prefetch that has not started yet is cheaper to run directly than
+        # to wait for a free worker
+        if future.cancel():
+            with self._lock:
+                self.unused += 1
+                self.cancelled += 1
+            return None
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+        with self._lock:
+            if result is not None and result["success"]:
+                self.hits += 1
+            else:
+                self.unused += 1
+                result = None
+        return result
+
+    def cancel(self, owner: Optional[str] = None) -> None:
+        """
+        Drop the prefetches scheduled for an owner (every prefetch if owner
+        is None), cancelling those that have not started
+        """
+        with self._lock:
+            keys = [key for key, (entry_owner, _) in self._entries.items() if owner is None or entry_owner == owner]
+            for key in keys:
+                _, future = self._entries.pop(key)
+                self.unused += 1
+                self.cancelled += int(future.cancel())
+
+    def stats(self) -> Dict[str, Any]:
+        """Prefetch counters; hit_rate is the share of prefetches that were used"""
+        with self._lock:
+            return {
+                "scheduled": self.scheduled,
+                "hits": self.hits,
+                "unused": self.unused,
+                "cancelled": self.cancelled,
+                "buffered": len(self._entries),
+                "hit_rate": self.hits / self.scheduled if self.scheduled else 0.0
+            }
@@ -0,0 +1,381 @@
+"""
+Headless HTTP server for the agent.
+
+Endpoints:
+    POST /v1/run     {"query": ..., "plan": ..., "deadline": ..., "history": [...],
+                      "cache": "use" | "refresh" | "bypass"}
+                     -> JSON {"answer", "error", "latency", usage fields, "trace"}
+    POST /v1/stream  same body -> server-sent events, one per AgentEvent
+    GET  /healthz    200 while serving, 503 while draining
+
+Requests wait in a bounded queue for one of --workers concurrent
+conversations; when the queue is full the server answers 429, and while it
+drains on SIGTERM/SIGINT it answers 503. A run whose client disconnects is
+cancelled, and a client that is slow to send its request gets 408. --processes starts several server
+processes sharing the port (SO_REUSEPORT) to use more cores.
+
+Usage:
+    python src/server.py --port 8000 --workers 16 --queue-size 64 --processes 4
+"""
+from typing import Dict, Any, Optional, Tuple
+from http import HTTPStatus
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+from dotenv import load_dotenv
+from agent import AsyncAgent, AgentEvent
+from planning import PLAN_MODES
+from cache import ANSWER_CACHE_MODES
+
+MAX_BODY_BYTES = 1024 * 1024
+# asyncio's StreamReader refuses lines over 64 KiB; the header count is capped separately
+MAX_HEADERS = 100
+HISTORY_ROLES = ("user", "assistant")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Job:
+    """A queued request; its worker forwards the run's events to the handler"""
+
+    def __init__(self, body: Dict[str, Any]):
+        self.query = body["query"]
+        self.plan = body.get("plan")
+        self.deadline = body.get("deadline")
+        self.history = body.get("history")
+        self.cache = body.get("cache") or "use"
+        self.events = asyncio.Queue()
+        self.cancelled = False
+        self.task = None
+
+    def cancel(self) -> None:
+        """Drop the job, stopping its run if a worker has started it"""
+        self.cancelled = True
+        if self.task is not None:
+            self.task.cancel()
+
+
+def event_to_dict(event: AgentEvent) -> Dict[str, Any]:
+    return {"type": event.type, "content": event.content, "data": event.data}
+
+
+def parse_body(raw: bytes) -> Dict[str, Any]:
+    """Validate a /v1/run or /v1/stream request body"""
+    try:
+        body = json.loads(raw or b"{}")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+    if not isinstance(body, dict) or not isinstance(body.get("query"), str) or not body["query"].strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object with a non-empty 'query'")
+    if body.get("plan") is not None and body["plan"] not in PLAN_MODES:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'plan' must be one of {PLAN_MODES}")
+    if body.get("deadline") is not None and not isinstance(body["deadline"], (int, float)):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'deadline' must be a number of seconds")
+    if body.get("history") is not None:
+        if not isinstance(body["history"], list):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'history' must be a list of messages")
+        for message in body["history"]:
+            if (not isinstance(message, dict) or message.get("role") not in HISTORY_ROLES
+                    or not isinstance(message.get("content"), str)):
+                raise HTTPError(
+                    HTTPStatus.BAD_REQUEST,
+                    f"'history' messages must be {{\"role\", \"content\"}} objects with a role in {HISTORY_ROLES}"
+                )
+        # Only the role and text are passed on to the model
+        body["history"] = [{"role": m["role"], "content": m["content"]} for m in body["history"]]
+    if body.get("cache") is not None and body["cache"] not in ANSWER_CACHE_MODES:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'cache' must be one of {ANSWER_CACHE_MODES}")
+    return body
+
+
+class AgentServer:
+    """
+    Serves one AsyncAgent over HTTP/1.1 (one request per connection). A
+    fixed number of worker tasks take jobs from a queue; up to workers
+    requests run and queue_size more wait, and load beyond that is refused
+    with 429 instead of piling up.
+    """
+
+    def __init__(
+        self,
+        agent: AsyncAgent,
+        workers: int = 16,
+        queue_size: int = 64,
+        drain_timeout: float = 30.0,
+        read_timeout: float = 10.0
+    ):
+        self.agent = agent
+        self.workers = workers
+        self.queue_size = queue_size
+        self.drain_timeout = drain_timeout
+        # Seconds a client gets to send its request line, headers and body
+        self.read_timeout = read_timeout
+        self.queue = asyncio.Queue()
+        self.draining = False
+        self.in_flight = 0
+        # Accepted jobs not yet finished, running or queued
+        self.pending = 0
+        self.requests = {"accepted": 0, "rejected": 0, "completed": 0}
+        self._server = None
+        self._workers = []
+
+    async def start(self, host: str, port: int, reuse_port: bool = False) -> None:
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle, host, port, reuse_port=reuse_port)
+
+    async def drain(self) -> None:
+        """
+        Refuse new requests with 503, let queued and running requests finish
+        (up to drain_timeout), then stop listening and stop the workers. The
+        listener stays open meanwhile so clients get a 503 to retry elsewhere
+        rather than a refused connection.
+        """
+        self.draining = True
+        try:
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self._server is not None:
+            self._server.close()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _run(self, job: Job) -> None:
+        """Run a job, forwarding its events"""
+        try:
+            async for event in self.agent.astream(job.query, job.plan, job.history, job.deadline, job.cache):
+                job.events.put_nowait(event)
+        except asyncio.CancelledError:
+            message = "Client disconnected" if job.cancelled else "Server shutting down"
+            job.events.put_nowait(AgentEvent("error", message, {}))
+            raise
+        except Exception as e:
+            job.events.put_nowait(AgentEvent("error", str(e), {}))
+        finally:
+            job.events.put_nowait(None)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            self.in_flight += 1
+            try:
+                if not job.cancelled:
+                    job.task = asyncio.ensure_future(self._run(job))
+                    # wait() rather than await, so a client cancelling its job does not stop the worker
+                    await asyncio.wait([job.task])
+            except asyncio.CancelledError:
+                job.task.cancel()
+                raise
+            finally:
+                self.in_flight -= 1
+                self.pending -= 1
+                self.requests["completed"] += 1
+                self.queue.task_done()
+
+    def _submit(self, body: Dict[str, Any]) -> Job:
+        if self.draining:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server is draining", {"Retry-After": "1"})
+        # Counted here rather than by queue size: a worker only takes a job off the queue once it gets to run
+        if self.pending >= self.workers + self.queue_size:
+            self.requests["rejected"] += 1
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, "Request queue is full", {"Retry-After": "1"})
+        job = Job(body)
+        self.queue.put_nowait(job)
+        self.pending += 1
+        self.requests["accepted"] += 1
+        return job
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        job = None
+        watcher = None
+        try:
+            try:
+                method, path, body = await asyncio.wait_for(self._read_request(reader), self.read_timeout)
+            except asyncio.TimeoutError:
+                raise HTTPError(HTTPStatus.REQUEST_TIMEOUT, "Timed out reading the request")
+            if path == "/healthz":
+                if method != "GET":
+                    raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+                status = HTTPStatus.SERVICE_UNAVAILABLE if self.draining else HTTPStatus.OK
+                await self._send_json(writer, status, {
+                    "status": "draining" if self.draining else "ok",
+                    "in_flight": self.in_flight,
+                    "queued": self.pending - self.in_flight,
+                    **self.requests
+                })
+            elif path in ("/v1/run", "/v1/stream"):
+                if method != "POST":
+                    raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+                job = self._submit(parse_body(body))
+                watcher = asyncio.ensure_future(self._watch_disconnect(reader, job))
+                if path == "/v1/run":
+                    await self._send_json(writer, HTTPStatus.OK, await self._collect(job))
+                else:
+                    await self._send_events(writer, job)
+            else:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": str(e)}, e.headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # Stop the run if the client went away before it finished
+            if job is not None:
+                job.cancel()
+            if watcher is not None:
+                watcher.cancel()
+            writer.close()
+
+    @staticmethod
+    async def _watch_disconnect(reader: asyncio.StreamReader, job: Job) -> None:
+        """Cancel a job as soon as its client closes the connection"""
+        try:
+            # The request has been read in full, so reads only end at EOF
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+        job.cancel()
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader, status: HTTPStatus, message: str) -> bytes:
+        try:
+            return await reader.readline()
+        except ValueError:
+            # readline() raises ValueError for a line over the reader's limit
+            raise HTTPError(status, message)
+
+    @classmethod
+    async def _read_request(cls, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        line = await cls._readline(reader, HTTPStatus.REQUEST_URI_TOO_LONG, "Request line is too long")
+        request_line = line.decode("latin-1").split()
+        if len(request_line) != 3:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        method, target, _ = request_line
+        headers = {}
+        while True:
+            line = await cls._readline(reader, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line is too long")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, f"More than {MAX_HEADERS} headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = headers.get("content-length") or "0"
+        if not length.isdigit():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Content-Length must be a non-negative integer")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Body exceeds {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method, target.split("?", 1)[0], body
+
+    @staticmethod
+    async def _send_json(
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        head = [f"HTTP/1.1 {status.value} {status.phrase}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _collect(job: Job) -> Dict[str, Any]:
+        """Wait for a job's run and return its result record"""
+        started = time.perf_counter()
+        result = {"answer": None, "error": None}
+        while (event := await job.events.get()) is not None:
+            if event.type in ("answer", "error"):
+                result["answer" if event.type == "answer" else "error"] = event.content
+                result.update(event.data.get("usage", {}))
+                result["cached"] = event.data.get("cached", False)
+                result["trace"] = event.data.get("trace")
+        result["latency"] = round(time.perf_counter() - started, 3)
+        return result
+
+    @staticmethod
+    async def _send_events(writer: asyncio.StreamWriter, job: Job) -> None:
+        """Stream a job's events as server-sent events"""
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                      "Cache-Control: no-cache\r\nConnection: close\r\n\r\n").encode("latin-1"))
+        while (event := await job.events.get()) is not None:
+            data = json.dumps(event_to_dict(event), ensure_ascii=False, default=str)
+            writer.write(f"event: {event.type}\ndata: {data}\n\n".encode("utf-8"))
+            await writer.drain()
+
+
+async def serve(args: argparse.Namespace, reuse_port: bool) -> None:
+    agent = AsyncAgent(
+        openai_api_key=os.environ["OPENAI_API_KEY"],
+        plan=args.plan,
+        deadline=args.deadline,
+        cache_answers=args.cache_answers
+    )
+    server = AgentServer(agent, args.workers, args.queue_size, args.drain_timeout, args.read_timeout)
+    await server.start(args.host, args.port, reuse_port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    print(f"[{os.getpid()}] Serving on http://{args.host}:{args.port}", flush=True)
+    await stop.wait()
+    print(f"[{os.getpid()}] Draining...", flush=True)
+    await server.drain()
+
+
+def _run_process(args: argparse.Namespace, reuse_port: bool) -> None:
+    asyncio.run(serve(args, reuse_port))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the agent over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent conversations per process")
+    parser.add_argument("--queue-size", type=int, default=64, help="Requests waiting per process before 429")
+    parser.add_argument("--processes", type=int, default=1, help="Server processes sharing the port")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="Seconds to finish requests on shutdown")
+    parser.add_argument("--read-timeout", type=float, default=10.0, help="Seconds a client gets to send its request")
+    parser.add_argument("--deadline", type=float, default=None, help="Default per-query deadline in seconds")
+    parser.add_argument("--plan", choices=PLAN_MODES, default="auto", help="Planning mode")
+    parser.add_argument("--cache-answers", action="store_true", help="Serve repeated questions from an answer cache")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        parser.error("Please set OPENAI_API_KEY in your .env file")
+
+    if args.processes == 1:
+        _run_process(args, False)
+        return
+    processes = [
+        multiprocessing.Process(target=_run_process, args=(args, True))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    # Pass SIGTERM on so every process drains; Ctrl+C already reaches them all
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
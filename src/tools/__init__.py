@@ -1,6 +1,23 @@
-from .calculator import CalculatorTool
-from .search import GoogleSearchTool
-from .datetime_tool import DateTimeTool
-from .wikipedia_tool import WikipediaTool
+from .payload import serialize_payload
+from .registry import ToolSpec, ToolSet, TOOL_SPECS, register_tool
 
-__all__ = ['CalculatorTool', 'GoogleSearchTool', 'DateTimeTool', 'WikipediaTool'] 
\ No newline at end of file
+# Tool classes are imported on first access so that importing this package
+# does not pull in serpapi, wikipedia or requests
+_LAZY_CLASSES = {
+    'CalculatorTool': '.calculator',
+    'GoogleSearchTool': '.search',
+    'DateTimeTool': '.datetime_tool',
+    'WikipediaTool': '.wikipedia_tool',
+    'DumpBackend': '.wikidump'
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_CLASSES:
+        import importlib
+        return getattr(importlib.import_module(_LAZY_CLASSES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['CalculatorTool', 'GoogleSearchTool', 'DateTimeTool', 'WikipediaTool', 'DumpBackend', 'serialize_payload',
+           'ToolSpec', 'ToolSet', 'TOOL_SPECS', 'register_tool']
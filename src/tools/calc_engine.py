@@ -0,0 +1,366 @@
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+import ast
+import math
+import operator
+import time
+from .payload import truncate_text
+
+try:
+    import numpy
+except ImportError:  # Batches are then evaluated one expression at a time
+    numpy = None
+
+# Binary operators an expression may use, and how each is computed
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow
+}
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+COMPARE_OPERATORS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+# Names the old eval-based calculator exposed
+ALLOWED_NAMES = ("math", "abs", "round", "pow")
+# Float-only operations that NumPy computes bit-for-bit like Python does
+VECTOR_OPERATORS = {ast.Add: "add", ast.Sub: "subtract", ast.Mult: "multiply", ast.Div: "divide"}
+VECTOR_FUNCTIONS = {"abs": "abs", "math.sqrt": "sqrt", "math.fabs": "abs"}
+MIN_VECTOR_BATCH = 8
+# Math functions whose result grows with the number or size of their
+# arguments; their inputs are checked before the C code runs
+PRODUCT_FUNCTIONS = (math.prod, math.lcm)
+SEQUENCE_TYPES = (list, tuple, str)
+
+
+class CalculatorError(ValueError):
+    """An expression is not allowed or exceeds the engine's limits"""
+
+
+def _size(value: Any, limit: int) -> int:
+    """
+    Items in a sequence, counting those of nested sequences too (a repeated
+    inner list counts once per reference). Stops counting past limit.
+    """
+    if not isinstance(value, (list, tuple)):
+        return 0
+    total = 0
+    pending = [value]
+    while pending and total <= limit:
+        sequence = pending.pop()
+        total += len(sequence)
+        pending.extend(item for item in sequence if isinstance(item, (list, tuple)))
+    return total
+
+
+def _pieces(value: Any):
+    """The parts of str(value), one at a time, so a long result can be cut short"""
+    if isinstance(value, (list, tuple)):
+        yield "[" if isinstance(value, list) else "("
+        for index, item in enumerate(value):
+            if index:
+                yield ", "
+            yield from _pieces(item)
+        if isinstance(value, tuple) and len(value) == 1:
+            yield ","
+        yield "]" if isinstance(value, list) else ")"
+    else:
+        yield repr(value)
+
+
+@dataclass(frozen=True)
+class CompiledExpression:
+    code: Any
+    # AST with numeric constants replaced by placeholders, for expressions
+    # NumPy can evaluate; None otherwise
+    template: Optional[ast.AST]
+    template_key: Optional[str]
+    constants: Tuple[float, ...]
+
+
+class _Limits:
+    """Checked operations for one evaluation, enforcing size and time limits"""
+
+    def __init__(self, engine: "CalculatorEngine"):
+        self.engine = engine
+        self.deadline = time.perf_counter() + engine.time_limit
+
+    def _tick(self) -> None:
+        if time.perf_counter() > self.deadline:
+            raise CalculatorError(f"Expression took longer than {self.engine.time_limit}s")
+
+    def _check_int(self, value: Any) -> Any:
+        if isinstance(value, int) and value.bit_length() > self.engine.max_int_bits:
+            raise CalculatorError(f"Result exceeds {self.engine.max_int_bits} bits")
+        return value
+
+    def _check_length(self, length: int) -> None:
+        if length > self.engine.max_sequence_length:
+            raise CalculatorError(f"Sequence exceeds {self.engine.max_sequence_length} items")
+
+    def size(self, value: Any) -> int:
+        """Nested item count of a sequence (its length for a str), capped just past the limit"""
+        if isinstance(value, str):
+            return len(value)
+        return _size(value, self.engine.max_sequence_length)
+
+    def binop(self, name: str, left: Any, right: Any) -> Any:
+        self._tick()
+        # Repetition and concatenation run in C, so their size is checked
+        # first; nested items count too, since printing the result expands
+        # every reference to a repeated inner list
+        if isinstance(left, SEQUENCE_TYPES) or isinstance(right, SEQUENCE_TYPES):
+            if name == "Mult":
+                sequence, count = (left, right) if isinstance(left, SEQUENCE_TYPES) else (right, left)
+                if isinstance(count, int):
+                    self._check_length(self.size(sequence) * max(count, 0))
+            elif name == "Add" and isinstance(left, SEQUENCE_TYPES) and isinstance(right, SEQUENCE_TYPES):
+                self._check_length(self.size(left) + self.size(right))
+        elif isinstance(left, int) and isinstance(right, int):
+            # Lower bounds on the result's bits: anything above them is still
+            # small enough to compute and is caught by _check_int
+            if name == "Pow" and right > 0 and abs(left) > 1:
+                if right > self.engine.max_exponent:
+                    raise CalculatorError(f"Exponent exceeds {self.engine.max_exponent}")
+                if (left.bit_length() - 1) * right + 1 > self.engine.max_int_bits:
+                    raise CalculatorError(f"Result exceeds {self.engine.max_int_bits} bits")
+            elif name == "Mult" and left and right and \
+                    left.bit_length() + right.bit_length() - 1 > self.engine.max_int_bits:
+                raise CalculatorError(f"Result exceeds {self.engine.max_int_bits} bits")
+        return self._check_int(BINARY_OPERATORS[getattr(ast, name)](left, right))
+
+    def call(self, function: Any, *args: Any) -> Any:
+        self._tick()
+        if function is pow and len(args) == 2:
+            return self.binop("Pow", *args)
+        if function in (math.factorial, math.comb, math.perm):
+            if any(isinstance(arg, int) and arg > self.engine.max_factorial for arg in args):
+                raise CalculatorError(f"Argument exceeds {self.engine.max_factorial}")
+        if function is round and len(args) == 2 and isinstance(args[1], int):
+            # round(n, -k) computes 10 ** k in C
+            if abs(args[1]) > self.engine.max_round_digits:
+                raise CalculatorError(f"round() digits exceed {self.engine.max_round_digits}")
+        # Iterable arguments (math.prod, math.fsum, ...) are consumed in C
+        items = []
+        for arg in args:
+            if isinstance(arg, (list, tuple)):
+                self._check_length(len(arg))
+                items.extend(arg)
+            else:
+                items.append(arg)
+        self._check_length(len(items))
+        if function in PRODUCT_FUNCTIONS:
+            # A product of nonzero factors has at least sum(bits - 1) + 1 bits
+            bits = [item.bit_length() for item in items if isinstance(item, int)]
+            if all(bits) and sum(bits) - len(bits) + 1 > self.engine.max_int_bits:
+                raise CalculatorError(f"Result exceeds {self.engine.max_int_bits} bits")
+        return self._check_int(function(*args))
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Routes every operator and call through the checked _Limits methods"""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        return ast.Call(
+            func=ast.Name(id="__binop", ctx=ast.Load()),
+            args=[ast.Constant(type(node.op).__name__), node.left, node.right],
+            keywords=[]
+        )
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        return ast.Call(
+            func=ast.Name(id="__call", ctx=ast.Load()),
+            args=[node.func] + node.args,
+            keywords=[]
+        )
+
+
+class CalculatorEngine:
+    """
+    Evaluates calculator expressions without raw eval. Expressions are parsed
+    into a whitelisted AST, compiled once and cached by text, and evaluated
+    with limits on integer size, exponents, sequence length and time.
+    Operations that run in C (big-int arithmetic, list repetition,
+    math.prod and friends, round) are checked before they start, since the
+    time limit is only checked between operations. Results match the
+    previous eval over {math, abs, round, pow}; format() renders them as
+    text of at most max_result_chars.
+    """
+
+    def __init__(
+        self,
+        max_expression_chars: int = 500,
+        max_int_bits: int = 10000,
+        max_exponent: int = 10000,
+        max_factorial: int = 1000,
+        max_sequence_length: int = 10000,
+        max_result_chars: int = 4000,
+        time_limit: float = 0.05,
+        cache_size: int = 1024
+    ):
+        self.max_expression_chars = max_expression_chars
+        self.max_int_bits = max_int_bits
+        self.max_exponent = max_exponent
+        self.max_factorial = max_factorial
+        self.max_sequence_length = max_sequence_length
+        # 10 ** max_round_digits is the largest power of ten that fits in max_int_bits
+        self.max_round_digits = int(max_int_bits * math.log10(2))
+        self.max_result_chars = max_result_chars
+        self.time_limit = time_limit
+        self.compile = lru_cache(maxsize=cache_size)(self._compile)
+
+    def _validate(self, tree: ast.AST) -> None:
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Expression, ast.Load, ast.List, ast.Tuple, ast.Compare)):
+                continue
+            if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+                continue
+            if isinstance(node, ast.UnaryOp) and isinstance(node.op, UNARY_OPERATORS):
+                continue
+            if isinstance(node, COMPARE_OPERATORS) or type(node) in BINARY_OPERATORS or isinstance(node, UNARY_OPERATORS):
+                continue
+            if isinstance(node, ast.Constant) and type(node.value) in (int, float, complex):
+                continue
+            if isinstance(node, ast.Name):
+                if node.id in ALLOWED_NAMES:
+                    continue
+                raise CalculatorError(f"name '{node.id}' is not defined")
+            if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+                    and node.value.id == "math" and not node.attr.startswith("_")):
+                continue
+            if isinstance(node, ast.Call) and not node.keywords and not any(
+                    isinstance(arg, ast.Starred) for arg in node.args):
+                continue
+            raise CalculatorError(f"'{type(node).__name__}' is not allowed in expressions")
+
+    def _compile(self, expression: str) -> CompiledExpression:
+        if len(expression) > self.max_expression_chars:
+            raise CalculatorError(f"Expression is longer than {self.max_expression_chars} characters")
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as e:
+            raise CalculatorError(f"Invalid expression: {e.msg}")
+        self._validate(tree)
+        template, constants = _vector_template(tree)
+        checked = ast.fix_missing_locations(_Rewriter().visit(tree))
+        return CompiledExpression(
+            code=compile(checked, "<calculator>", "eval"),
+            template=template,
+            template_key=ast.dump(template) if template is not None else None,
+            constants=constants
+        )
+
+    def evaluate(self, expression: str) -> Any:
+        """Evaluate one expression, raising on invalid input or exceeded limits"""
+        return self._run(self.compile(expression))
+
+    def _run(self, compiled: CompiledExpression) -> Any:
+        limits = _Limits(self)
+        namespace = {
+            "math": math,
+            "abs": abs,
+            "round": round,
+            "pow": pow,
+            "__binop": limits.binop,
+            "__call": limits.call
+        }
+        result = eval(compiled.code, {"__builtins__": {}}, namespace)
+        # List literals can nest sequences without going through binop
+        limits._check_length(limits.size(result))
+        return result
+
+    def format(self, value: Any) -> str:
+        """str(value), cut to max_result_chars without rendering the rest"""
+        text = []
+        length = 0
+        for piece in _pieces(value):
+            text.append(piece)
+            length += len(piece)
+            if length > self.max_result_chars:
+                break
+        return truncate_text("".join(text), self.max_result_chars)
+
+    def evaluate_many(self, expressions: List[str]) -> List[Dict[str, Any]]:
+        """
+        Evaluate many expressions, returning a {"success", "result"} dict per
+        expression in order. Float expressions sharing a shape are computed
+        together with NumPy when it is installed.
+        """
+        results = [None] * len(expressions)
+        compiled = [None] * len(expressions)
+        groups = {}
+        for index, expression in enumerate(expressions):
+            try:
+                compiled[index] = self.compile(expression)
+            except Exception as e:
+                results[index] = {"success": False, "result": f"Error: {str(e)}"}
+                continue
+            if numpy is not None and compiled[index].template_key is not None:
+                groups.setdefault(compiled[index].template_key, []).append(index)
+
+        for indices in groups.values():
+            if len(indices) < MIN_VECTOR_BATCH:
+                continue
+            columns = numpy.array([compiled[index].constants for index in indices]).T
+            with numpy.errstate(all="ignore"):
+                values = _evaluate_vector(compiled[indices[0]].template.body, columns)
+            for index, value in zip(indices, numpy.broadcast_to(values, (len(indices),)).tolist()):
+                # Python raises where NumPy returns inf/nan; those rows are
+                # evaluated one by one below to reproduce its behaviour
+                if math.isfinite(value):
+                    results[index] = {"success": True, "result": self.format(value)}
+
+        for index, expression in enumerate(expressions):
+            if results[index] is None:
+                try:
+                    results[index] = {"success": True, "result": self.format(self._run(compiled[index]))}
+                except Exception as e:
+                    results[index] = {"success": False, "result": f"Error: {str(e)}"}
+        return results
+
+
+def _vector_template(tree: ast.Expression) -> Tuple[Optional[ast.AST], Tuple[float, ...]]:
+    """
+    Replace the float constants of a NumPy-compatible expression with
+    numbered placeholders. Returns (None, ()) for other expressions.
+    """
+    constants = []
+
+    def convert(node: ast.AST) -> Optional[ast.AST]:
+        if isinstance(node, ast.Constant) and type(node.value) is float:
+            constants.append(node.value)
+            return ast.Name(id=f"c{len(constants) - 1}", ctx=ast.Load())
+        if isinstance(node, ast.BinOp) and type(node.op) in VECTOR_OPERATORS:
+            left, right = convert(node.left), convert(node.right)
+            return ast.BinOp(left=left, op=node.op, right=right) if left and right else None
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, UNARY_OPERATORS):
+            operand = convert(node.operand)
+            return ast.UnaryOp(op=node.op, operand=operand) if operand else None
+        if isinstance(node, ast.Call) and len(node.args) == 1 and ast.unparse(node.func) in VECTOR_FUNCTIONS:
+            arg = convert(node.args[0])
+            return ast.Call(func=node.func, args=[arg], keywords=[]) if arg else None
+        return None
+
+    body = convert(tree.body)
+    if body is None or not constants:
+        return None, ()
+    return ast.Expression(body=body), tuple(constants)
+
+
+def _evaluate_vector(node: ast.AST, columns: Any) -> Any:
+    """Evaluate a template over columns of constants with NumPy ufuncs"""
+    if isinstance(node, ast.Name):
+        return columns[int(node.id[1:])]
+    if isinstance(node, ast.BinOp):
+        ufunc = getattr(numpy, VECTOR_OPERATORS[type(node.op)])
+        return ufunc(_evaluate_vector(node.left, columns), _evaluate_vector(node.right, columns))
+    if isinstance(node, ast.UnaryOp):
+        operand = _evaluate_vector(node.operand, columns)
+        return numpy.negative(operand) if isinstance(node.op, ast.USub) else operand
+    ufunc = getattr(numpy, VECTOR_FUNCTIONS[ast.unparse(node.func)])
+    return ufunc(_evaluate_vector(node.args[0], columns))
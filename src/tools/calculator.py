@@ -1,31 +1,33 @@
-from typing import Dict, Any
-import math
+from typing import Dict, Any, List, Optional
+from .calc_engine import CalculatorEngine
 
 class CalculatorTool:
     name = "calculator"
     description = "Useful for performing mathematical calculations"
 
+    def __init__(self, engine: Optional[CalculatorEngine] = None):
+        # Expressions are checked against a whitelist and evaluated with
+        # size and time limits instead of with raw eval
+        self.engine = engine or CalculatorEngine()
+
     def run(self, expression: str) -> Dict[str, Any]:
         """
         Evaluates a mathematical expression and returns the result
         """
         try:
-            # Create a safe dictionary of allowed functions
-            safe_dict = {
-                'math': math,
-                'abs': abs,
-                'round': round,
-                'pow': pow
-            }
-            
-            # Evaluate the expression in a safe context
-            result = eval(expression, {"__builtins__": {}}, safe_dict)
+            result = self.engine.evaluate(expression)
             return {
                 "success": True,
-                "result": str(result)  # Convert to string to ensure JSON serialization
+                "result": self.engine.format(result)  # Capped text, so it serializes to JSON
             }
         except Exception as e:
             return {
                 "success": False,
                 "result": f"Error: {str(e)}"
-            } 
\ No newline at end of file
+            }
+
+    def run_many(self, expressions: List[str]) -> List[Dict[str, Any]]:
+        """
+        Evaluates many expressions at once, returning one result per expression
+        """
+        return self.engine.evaluate_many(expressions)
@@ -0,0 +1,38 @@
+from typing import Any, Dict, List
+import json
+
+ELLIPSIS = "…"
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """
+    Cut text to at most max_chars, preferring a word boundary, and mark the
+    cut with an ellipsis. The same input always gives the same output.
+    """
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(max_chars - len(ELLIPSIS), 0)]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + ELLIPSIS
+
+
+def cap_items(items: List[Dict[str, Any]], max_chars: int) -> List[Dict[str, Any]]:
+    """
+    Keep the leading items whose compact serialization fits in max_chars.
+    The first item is always kept so a result is never empty.
+    """
+    kept = []
+    for item in items:
+        if kept and len(serialize_payload(kept + [item])) > max_chars:
+            break
+        kept.append(item)
+    return kept
+
+
+def serialize_payload(payload: Any) -> str:
+    """Serialize a tool payload for a tool message as compactly as possible"""
+    if isinstance(payload, str):
+        return payload
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,225 @@
+from typing import Dict, Any, List, Optional, Callable
+from dataclasses import dataclass
+import importlib
+import threading
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """
+    Everything the agent needs to know about a tool, declared in one place.
+    The tool's module is imported and the tool instantiated only when the
+    tool is first used.
+    """
+    name: str
+    # Module defining the tool; a leading "." means relative to this package
+    module: str
+    class_name: str
+    description: str
+    parameters: Dict[str, Any]
+    # Maps the model's arguments to the query string the tool's run() expects
+    to_query: Callable[[Dict[str, Any]], str]
+    # Whether results may be served from the tool cache
+    cacheable: bool = True
+    # Maximum calls in flight at once (None for unbounded)
+    max_concurrency: Optional[int] = None
+    # Whether a slow call may be duplicated (idempotent network reads only)
+    hedge: bool = False
+    # Predicts likely follow-up calls from a call's arguments and result, most
+    # likely first, for the agent's optional prefetcher
+    prefetch: Optional[Callable[[Dict[str, Any], Any], List[Dict[str, Any]]]] = None
+    # Entry for the planning prompt's list of tools
+    plan_hint: str = ""
+    # Extra instructions for the planning and system prompts
+    plan_guidance: str = ""
+    system_guidance: str = ""
+
+    def openai_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+                "strict": True
+            }
+        }
+
+    def load(self):
+        """Import the tool's module and return its class"""
+        return getattr(importlib.import_module(self.module, __package__), self.class_name)
+
+
+TOOL_SPECS: Dict[str, ToolSpec] = {}
+
+
+def register_tool(spec: ToolSpec) -> ToolSpec:
+    """Make a tool available to agents; later registrations replace earlier ones"""
+    TOOL_SPECS[spec.name] = spec
+    return spec
+
+
+def _datetime_query(args: Dict[str, Any]) -> str:
+    if args["operation"] == "today":
+        return "today"
+    return f"{args['operation']}:{args['days']}"
+
+
+def _wikipedia_prefetch(args: Dict[str, Any], result: Any) -> List[Dict[str, Any]]:
+    # A search is almost always followed by reading one of its top results
+    if args["action"] != "search" or not isinstance(result, list):
+        return []
+    return [{"action": "read", "query": title} for title in result]
+
+
+register_tool(ToolSpec(
+    name="calculator",
+    module=".calculator",
+    class_name="CalculatorTool",
+    description="Perform mathematical calculations with support for basic operations and math functions",
+    parameters={
+        "type": "object",
+        "properties": {
+            "expression": {
+                "type": "string",
+                "description": "The mathematical expression to evaluate (e.g., '2 + 2', 'math.sqrt(16)')"
+            }
+        },
+        "required": ["expression"],
+        "additionalProperties": False
+    },
+    to_query=lambda args: args["expression"],
+    plan_hint="calculator: For mathematical calculations"
+))
+
+register_tool(ToolSpec(
+    name="google_search",
+    module=".search",
+    class_name="GoogleSearchTool",
+    description="Search the internet for current information",
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "The search query to find information"
+            }
+        },
+        "required": ["query"],
+        "additionalProperties": False
+    },
+    to_query=lambda args: args["query"],
+    # Keep bursts of parallel searches within the SerpAPI quota
+    max_concurrency=2,
+    hedge=True,
+    plan_hint="google_search: For searching the internet for current information"
+))
+
+register_tool(ToolSpec(
+    name="datetime",
+    module=".datetime_tool",
+    class_name="DateTimeTool",
+    description="Get dates relative to today, including the day of the week",
+    parameters={
+        "type": "object",
+        "properties": {
+            "operation": {
+                "type": "string",
+                "enum": ["today", "days_ago", "days_ahead"],
+                "description": "The type of date calculation to perform"
+            },
+            "days": {
+                "type": "integer",
+                "description": "Number of days for ago/ahead operations. Required when operation is 'days_ago' or 'days_ahead'."
+            }
+        },
+        "required": ["operation", "days"],
+        "additionalProperties": False
+    },
+    to_query=_datetime_query,
+    # Results depend on the current date, so they must never be cached
+    cacheable=False,
+    plan_hint="datetime: For date calculations (today, days_ago, days_ahead)",
+    system_guidance="""For date-related queries, always use the datetime tool to get accurate results.
+For the datetime tool:
+- Use operation="today" with days=0 to get today's date
+- Use operation="days_ago" with the number of days to get a past date
+- Use operation="days_ahead" with the number of days to get a future date"""
+))
+
+register_tool(ToolSpec(
+    name="wikipedia",
+    module=".wikipedia_tool",
+    class_name="WikipediaTool",
+    description="Search Wikipedia articles and read their content",
+    parameters={
+        "type": "object",
+        "properties": {
+            "action": {
+                "type": "string",
+                "enum": ["search", "read"],
+                "description": "Whether to search for articles or read a specific article"
+            },
+            "query": {
+                "type": "string",
+                "description": "The search term or article title"
+            }
+        },
+        "required": ["action", "query"],
+        "additionalProperties": False
+    },
+    to_query=lambda args: f"{args['action']}:{args['query']}",
+    max_concurrency=4,
+    hedge=True,
+    prefetch=_wikipedia_prefetch,
+    plan_hint="""wikipedia: For searching and reading Wikipedia articles
+   - Use action="search" to find relevant articles
+   - Use action="read" to get article content and summary""",
+    plan_guidance="""For Wikipedia queries, it's often good to:
+1. First search for relevant articles
+2. Then read the most relevant article
+3. Use google_search if additional current information is needed""",
+    system_guidance="""For Wikipedia queries:
+- Use action="search" to find relevant articles
+- Use action="read" to get the content of a specific article"""
+))
+
+
+class ToolSet:
+    """
+    The tools available to an agent. Tool instances are created on first use
+    (thread-safe), so unused tools cost nothing at startup.
+    """
+
+    def __init__(self, names: Optional[List[str]] = None, instances: Optional[Dict[str, Any]] = None):
+        names = list(names) if names is not None else list(TOOL_SPECS)
+        unknown = [name for name in names if name not in TOOL_SPECS]
+        if unknown:
+            raise ValueError(f"Unknown tools: {unknown}")
+        self.specs = {name: TOOL_SPECS[name] for name in names}
+        # Pre-built instances (e.g. stubs) take the place of lazy construction
+        self._instances = dict(instances or {})
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.specs
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def spec(self, name: str) -> Optional[ToolSpec]:
+        return self.specs.get(name)
+
+    def get(self, name: str):
+        """Return the tool instance, importing and constructing it if needed"""
+        tool = self._instances.get(name)
+        if tool is None:
+            with self._lock:
+                tool = self._instances.get(name)
+                if tool is None:
+                    tool = self.specs[name].load()()
+                    self._instances[name] = tool
+        return tool
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        return [spec.openai_schema() for spec in self.specs.values()]
@@ -0,0 +1,228 @@
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple, Type, TypeVar
+from collections import deque
+import asyncio
+import random
+import threading
+import time
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    """A query ran past its overall deadline"""
+
+
+class TransientError(Exception):
+    """A failure worth retrying, e.g. an HTTP 5xx or 429 response"""
+
+
+class Deadline:
+    """
+    Time budget shared by every LLM call and tool call of one query. A
+    deadline of None never expires.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Query exceeded its {self.seconds}s deadline")
+
+    def timeout(self, per_call: Optional[float]) -> Optional[float]:
+        """The per-call timeout, shortened to what is left of the deadline"""
+        remaining = self.remaining()
+        if remaining is None:
+            return per_call
+        if per_call is None:
+            return remaining
+        return min(per_call, remaining)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: before retry n the caller sleeps a
+    random time between 0 and min(max_delay, base_delay * 2**n). Only
+    exceptions of the retryable types are retried.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        retryable: Tuple[Type[BaseException], ...] = (ConnectionError, TimeoutError, TransientError)
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def should_retry(self, error: BaseException, attempt: int, deadline: Optional[Deadline] = None) -> bool:
+        """Whether a failed attempt (counting from 1) is worth repeating"""
+        if attempt >= self.attempts or not isinstance(error, self.retryable):
+            return False
+        return deadline is None or not deadline.expired()
+
+
+def retry_call(fn: Callable[[], T], policy: RetryPolicy, deadline: Optional[Deadline] = None) -> T:
+    """Call a blocking function, retrying it according to the policy"""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn()
+        except Exception as e:
+            if not policy.should_retry(e, attempt, deadline):
+                raise
+            delay = policy.delay(attempt - 1)
+            if deadline is not None and deadline.remaining() is not None:
+                delay = min(delay, deadline.remaining())
+            time.sleep(delay)
+
+
+async def aretry_call(
+    fn: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    deadline: Optional[Deadline] = None
+) -> T:
+    """Await fn(), retrying it according to the policy"""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await fn()
+        except Exception as e:
+            if not policy.should_retry(e, attempt, deadline):
+                raise
+            delay = policy.delay(attempt - 1)
+            if deadline is not None and deadline.remaining() is not None:
+                delay = min(delay, deadline.remaining())
+            await asyncio.sleep(delay)
+
+
+class LatencyTracker:
+    """Recent latencies per operation, for choosing when to hedge"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, latency: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(latency)
+
+    def percentile(self, key: str, fraction: float = 0.95) -> Optional[float]:
+        """The latency percentile of an operation, or None until it has enough samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(fraction * len(samples)), len(samples) - 1)]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self._samples)
+        return {key: {"p50": self.percentile(key, 0.5), "p95": self.percentile(key, 0.95)} for key in keys}
+
+
+class ConcurrencyLimit:
+    """
+    A semaphore that coroutines on any event loop wait for without holding a
+    thread, and that pool threads can take without waiting. A slot may be
+    released from any thread; it is handed to the oldest waiter.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                waiting = (loop, waiter) in self._waiters
+                if waiting:
+                    self._waiters.remove((loop, waiter))
+            # A slot handed over just before the cancellation is passed on
+            if not waiting and waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free, without waiting"""
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                if waiter.done():
+                    continue
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, waiter)
+                    return
+                except RuntimeError:  # The waiter's loop is closed
+                    continue
+            self.in_use -= 1
+
+    def _hand_over(self, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            # Cancelled while the slot was on its way
+            self.release()
+        else:
+            waiter.set_result(None)
+
+
+async def hedged(fn: Callable[[], Awaitable[T]], hedge_after: Optional[float]) -> Tuple[T, bool]:
+    """
+    Await fn(); if it has not finished after hedge_after seconds, start a
+    duplicate and return whichever finishes first. Returns (result, hedged).
+    Only use this for idempotent operations.
+    """
+    tasks = [asyncio.ensure_future(fn())]
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                tasks.append(asyncio.ensure_future(fn()))
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), len(tasks) > 1
+            # A failed request still leaves the other one to finish
+            if not pending:
+                return done.pop().result(), len(tasks) > 1
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,27 +1,61 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from serpapi import GoogleSearch
 import os
+import requests
+from .resilience import RetryPolicy, TransientError, retry_call
+from .payload import truncate_text, cap_items
 
 class GoogleSearchTool:
     name = "google_search"
     description = "Search the internet for information"
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_results: int = 3,
+        max_snippet_chars: int = 300,
+        max_result_chars: int = 1200,
+        timeout: float = 10.0,
+        retry_policy: Optional[RetryPolicy] = None
+    ):
         self.api_key = os.getenv("SERPAPI_API_KEY")
         if not self.api_key:
             raise ValueError("SERPAPI_API_KEY environment variable is not set")
+        # Per-request timeout in seconds (serpapi's default is 60000), and
+        # retries of connection failures, timeouts, 5xx and 429 responses
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy(
+            retryable=(requests.ConnectionError, requests.Timeout, TransientError)
+        )
+        # Size caps on the payload returned to the model
+        self.max_results = max_results
+        self.max_snippet_chars = max_snippet_chars
+        self.max_result_chars = max_result_chars
+
+    @staticmethod
+    def _fetch(search: GoogleSearch) -> requests.Response:
+        # Check the status before parsing: an overloaded SerpAPI answers with
+        # an HTML error page that is not worth decoding
+        response = search.get_response()
+        if response.status_code >= 500 or response.status_code == 429:
+            raise TransientError(f"SerpAPI returned HTTP {response.status_code}")
+        return response
 
     def run(self, query: str) -> Dict[str, Any]:
         """
-        Performs a Google search and returns the results
+        Performs a Google search and returns the results as a list of
+        {title, snippet, url}
         """
         try:
             search = GoogleSearch({
                 "q": query,
                 "api_key": self.api_key,
-                "num": 3  # Limit to top 3 results
+                "num": self.max_results,
+                "output": "json"
             })
-            results = search.get_dict()
+            search.timeout = self.timeout
+            # Error responses such as a bad API key still carry a JSON body
+            # with an "error" field
+            results = retry_call(lambda: self._fetch(search), self.retry_policy).json()
             
             if "error" in results:
                 return {
@@ -37,16 +71,20 @@ class GoogleSearchTool:
                     "result": "No results found."
                 }
 
-            # Format results as a clean string
-            formatted_results = []
-            for result in organic_results:
-                title = result.get("title", "")
-                snippet = result.get("snippet", "")
-                formatted_results.append(f"{title}\n{snippet}")
+            # Build compact records, truncating snippets and then dropping
+            # trailing results until the payload fits
+            formatted_results = [
+                {
+                    "title": result.get("title", ""),
+                    "snippet": truncate_text(result.get("snippet", ""), self.max_snippet_chars),
+                    "url": result.get("link", "")
+                }
+                for result in organic_results[:self.max_results]
+            ]
 
             return {
                 "success": True,
-                "result": "\n\n".join(formatted_results)
+                "result": cap_items(formatted_results, self.max_result_chars)
             }
 
         except Exception as e:
@@ -0,0 +1,296 @@
+"""
+Offline Wikipedia backend built from a local dump extract.
+
+The source is a JSONL file with one article per line, as written by
+WikiExtractor's --json mode: {"title", "text", "url"}. A line may instead
+carry "redirect" (the target title) or "options" (the titles a
+disambiguation page lists). build_index() turns it into an index directory:
+
+    summaries.zz   zlib-compressed article records, one after another
+    offsets.u64    offset of each record in summaries.zz (plus the end)
+    titles.keys    normalized titles and redirects, sorted, concatenated
+    titles.idx     (key offset, key length, article) per title, sorted
+    words.keys     normalized title words, sorted, concatenated
+    words.idx      (key offset, key length, article) per title word
+    meta.json      counts and build settings
+
+DumpBackend memory-maps these files, so opening an index is instant and a
+lookup only touches the pages it needs.
+
+Usage (from src/):
+    python -m tools.wikidump build extract.jsonl wiki_index/
+"""
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+import argparse
+import bisect
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+import wikipedia
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "data", "wikipedia_fixture.jsonl")
+INDEX_VERSION = 1
+ARTICLE_URL = "https://en.wikipedia.org/wiki/{}"
+
+_OFFSET = struct.Struct("<Q")
+# Key offset, key length, article number
+_ENTRY = struct.Struct("<QII")
+
+
+# Words whose trailing "." does not end a sentence
+_ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "st", "jr", "sr", "vs", "etc", "no", "approx", "ca", "e.g", "i.e"}
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def first_sentences(text: str, sentences: int) -> str:
+    """
+    Return the first few sentences of a plain-text extract. A period after
+    an initial or a known abbreviation ("U.S.", "Dr.", "e.g.") does not end
+    a sentence.
+    """
+    text = text.strip()
+    found = 0
+    for match in _SENTENCE_END.finditer(text):
+        word = text[:match.start()].rsplit(None, 1)[-1].rstrip(".").casefold()
+        last = word.rsplit(".", 1)[-1]
+        if text[match.start() - 1] == "." and (len(last) == 1 or word in _ABBREVIATIONS):
+            continue
+        found += 1
+        if found == sentences:
+            return text[:match.start()]
+    return text
+
+
+def normalize_title(title: str) -> str:
+    """Same title normalization as MediaWikiBackend: underscores, spacing and case are ignored"""
+    return " ".join(title.replace("_", " ").split()).casefold()
+
+
+def _read_source(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not record.get("title"):
+                raise ValueError(f"{path}:{line_number}: record has no 'title'")
+            yield record
+
+
+def _write_keys(index_dir: str, name: str, entries: List[Tuple[bytes, int]]) -> None:
+    entries.sort()
+    offset = 0
+    with open(os.path.join(index_dir, f"{name}.keys"), "wb") as keys, \
+            open(os.path.join(index_dir, f"{name}.idx"), "wb") as idx:
+        for key, article in entries:
+            keys.write(key)
+            idx.write(_ENTRY.pack(offset, len(key), article))
+            offset += len(key)
+
+
+def _title_words(key: str) -> List[str]:
+    return re.findall(r"\w+", key)
+
+
+def build_index(source_path: str, index_dir: str, sentences: int = 5) -> Dict[str, Any]:
+    """Build an index directory from a JSONL dump extract; returns its metadata"""
+    os.makedirs(index_dir, exist_ok=True)
+    numbers = {}
+    redirects = []
+    titles = []
+    words = []
+    # Articles are streamed to disk; only titles stay in memory
+    with open(os.path.join(index_dir, "summaries.zz"), "wb") as summaries, \
+            open(os.path.join(index_dir, "offsets.u64"), "wb") as offsets:
+        for record in _read_source(source_path):
+            title = record["title"]
+            key = normalize_title(title)
+            if record.get("redirect"):
+                redirects.append((key, normalize_title(record["redirect"])))
+                continue
+            stored = {
+                "title": title,
+                "summary": first_sentences(record.get("summary") or record.get("text", ""), sentences),
+                "url": record.get("url") or ARTICLE_URL.format(title.replace(" ", "_")),
+                "options": record.get("options")
+            }
+            number = len(numbers)
+            numbers[key] = number
+            offsets.write(_OFFSET.pack(summaries.tell()))
+            summaries.write(zlib.compress(json.dumps(stored, ensure_ascii=False).encode("utf-8"), 9))
+            titles.append((key.encode("utf-8"), number))
+            words.extend((word.encode("utf-8"), number) for word in set(_title_words(key)))
+        offsets.write(_OFFSET.pack(summaries.tell()))
+
+    # Redirects point straight at their target's record
+    resolved = 0
+    for key, target in redirects:
+        if target in numbers:
+            titles.append((key.encode("utf-8"), numbers[target]))
+            resolved += 1
+
+    _write_keys(index_dir, "titles", titles)
+    _write_keys(index_dir, "words", words)
+    meta = {
+        "version": INDEX_VERSION,
+        "source": os.path.abspath(source_path),
+        "articles": len(numbers),
+        "redirects": resolved,
+        "sentences": sentences
+    }
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _map(path: str):
+    with open(path, "rb") as f:
+        # mmap cannot map empty files
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _SortedKeys:
+    """A memory-mapped sorted (key, article) table, searched in place"""
+
+    def __init__(self, index_dir: str, name: str):
+        self._keys = _map(os.path.join(index_dir, f"{name}.keys"))
+        self._idx = _map(os.path.join(index_dir, f"{name}.idx"))
+        self._count = len(self._idx) // _ENTRY.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        # Lets bisect search the keys without reading the whole table
+        offset, length, _ = _ENTRY.unpack_from(self._idx, i * _ENTRY.size)
+        return self._keys[offset:offset + length]
+
+    def article(self, i: int) -> int:
+        return _ENTRY.unpack_from(self._idx, i * _ENTRY.size)[2]
+
+    def exact(self, key: bytes) -> List[int]:
+        start = bisect.bisect_left(self, key)
+        end = bisect.bisect_right(self, key, start)
+        return [self.article(i) for i in range(start, end)]
+
+    def prefixed(self, prefix: bytes, limit: Optional[int] = None) -> Iterator[int]:
+        """Articles of the keys starting with prefix, in key order"""
+        i = bisect.bisect_left(self, prefix)
+        found = 0
+        while i < self._count and self[i].startswith(prefix) and (limit is None or found < limit):
+            yield self.article(i)
+            found += 1
+            i += 1
+
+
+class DumpBackend:
+    """
+    Wikipedia backend answering from a local index built by build_index().
+    Same interface and errors as MediaWikiBackend, so WikipediaTool's
+    output does not depend on which backend answered.
+    """
+
+    def __init__(self, index_dir: str, max_word_matches: int = 5000):
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"{index_dir} was built by another version; rebuild it")
+        self.index_dir = index_dir
+        self.max_word_matches = max_word_matches
+        self._summaries = _map(os.path.join(index_dir, "summaries.zz"))
+        self._offsets = _map(os.path.join(index_dir, "offsets.u64"))
+        self._titles = _SortedKeys(index_dir, "titles")
+        self._words = _SortedKeys(index_dir, "words")
+
+    @classmethod
+    def from_source(cls, source_path: str, index_dir: str, **kwargs) -> "DumpBackend":
+        """Open an index, building it first if it is missing or older than the source"""
+        meta_path = os.path.join(index_dir, "meta.json")
+        if not os.path.exists(meta_path) or os.path.getmtime(meta_path) < os.path.getmtime(source_path):
+            build_index(source_path, index_dir)
+        return cls(index_dir, **kwargs)
+
+    def _record(self, article: int) -> Dict[str, Any]:
+        start, = _OFFSET.unpack_from(self._offsets, article * _OFFSET.size)
+        end, = _OFFSET.unpack_from(self._offsets, (article + 1) * _OFFSET.size)
+        return json.loads(zlib.decompress(self._summaries[start:end]))
+
+    def _word_matches(self, words: List[str]) -> List[int]:
+        """Articles whose titles contain every word, the last one as a prefix"""
+        matches = None
+        for position, word in enumerate(words):
+            key = word.encode("utf-8")
+            if position == len(words) - 1:
+                found = set(self._words.prefixed(key, self.max_word_matches))
+            else:
+                found = set(self._words.exact(key))
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return sorted(matches)
+
+    def search(self, term: str, limit: int = 5) -> List[str]:
+        """
+        Return the titles of the best matches for a term: the exact title
+        (or redirect) first, then titles starting with the term, then titles
+        containing all its words
+        """
+        key = normalize_title(term)
+        if not key:
+            return []
+        encoded = key.encode("utf-8")
+        articles = []
+        for candidates in (
+            self._titles.exact(encoded),
+            self._titles.prefixed(encoded, limit * 4),
+            self._word_matches(_title_words(key))
+        ):
+            for article in candidates:
+                if article not in articles:
+                    articles.append(article)
+            if len(articles) >= limit:
+                break
+        return [self._record(article)["title"] for article in articles[:limit]]
+
+    def read(self, title: str) -> Dict[str, Any]:
+        """
+        Return {"title", "summary", "url"} for an article. Raises
+        wikipedia.DisambiguationError or wikipedia.PageError like the
+        wikipedia package does.
+        """
+        if not normalize_title(title):
+            # PageError takes a page id first and the title second
+            raise wikipedia.PageError(None, title)
+        articles = self._titles.exact(normalize_title(title).encode("utf-8"))
+        if articles:
+            record = self._record(articles[0])
+        else:
+            # Fall back to the best search match, as the live backend does
+            suggestions = self.search(title, limit=1)
+            if not suggestions or normalize_title(suggestions[0]) == normalize_title(title):
+                raise wikipedia.PageError(None, title)
+            record = self._record(self._titles.exact(normalize_title(suggestions[0]).encode("utf-8"))[0])
+        if record["options"]:
+            raise wikipedia.DisambiguationError(record["title"], record["options"])
+        return {"title": record["title"], "summary": record["summary"], "url": record["url"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an offline Wikipedia index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build an index from a JSONL dump extract")
+    build.add_argument("source", help="JSONL file of {\"title\", \"text\", \"url\"} records")
+    build.add_argument("index_dir", help="Directory to write the index to")
+    build.add_argument("--sentences", type=int, default=5, help="Sentences kept per summary")
+    args = parser.parse_args(argv)
+    print(json.dumps(build_index(args.source, args.index_dir, args.sentences)))
+
+
+if __name__ == "__main__":
+    main()
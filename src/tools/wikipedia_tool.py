@@ -1,42 +1,242 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Callable
+from collections import OrderedDict
+import os
+import threading
+import requests
 import wikipedia
+from .resilience import RetryPolicy, TransientError, retry_call
+from .payload import truncate_text
+
+API_URL = "https://en.wikipedia.org/w/api.php"
+USER_AGENT = "simple-agent (https://github.com/jmiano/simple-agent)"
+
+# Properties requested with every page so one response yields the resolved
+# title, the intro extract, the URL and whether the page is a disambiguation.
+# The extract's length is set per backend with "exsentences".
+PAGE_PROPS = {
+    "prop": "extracts|info|pageprops",
+    "exintro": 1,
+    "explaintext": 1,
+    "exlimit": "max",
+    "inprop": "url",
+    "ppprop": "disambiguation",
+    "redirects": 1
+}
+
+
+class MediaWikiBackend:
+    """
+    Live Wikipedia backend that talks to the MediaWiki API directly.
+
+    A read resolves the title and returns the summary and URL from a single
+    request. Resolved pages, redirects and disambiguation results are kept in
+    a bounded in-process store, and a search stores the intro of every result,
+    so a read that follows a search on the same term needs no further I/O.
+    """
+
+    def __init__(
+        self,
+        request_fn: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        sentences: int = 5,
+        max_entries: int = 2048,
+        timeout: float = 10.0,
+        retry_policy: Optional[RetryPolicy] = None
+    ):
+        # request_fn takes API query parameters and returns the decoded JSON;
+        # it can be replaced with recorded responses
+        self._request_fn = request_fn or self._http_request
+        self._session = None
+        # Per-request timeout in seconds, and retries of connection failures,
+        # timeouts and 5xx/429 responses (MediaWiki queries are idempotent)
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy(
+            retryable=(requests.ConnectionError, requests.Timeout, TransientError)
+        )
+        # MediaWiki cuts the extract to whole sentences itself, so
+        # abbreviations like "U.S." do not end a summary early
+        self.sentences = sentences
+        self._page_props = {**PAGE_PROPS, "exsentences": sentences}
+        self.max_entries = max_entries
+        self.fetches = 0
+        self._pages = OrderedDict()
+        self._aliases = OrderedDict()
+        self._searches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _http_request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers["User-Agent"] = USER_AGENT
+        response = self._session.get(API_URL, params=params, timeout=self.timeout)
+        if response.status_code >= 500 or response.status_code == 429:
+            raise TransientError(f"Wikipedia API returned HTTP {response.status_code}")
+        response.raise_for_status()
+        return response.json()
+
+    def _request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.fetches += 1
+        params = {"action": "query", "format": "json", **params}
+        return retry_call(lambda: self._request_fn(params), self.retry_policy)
+
+    @staticmethod
+    def _key(title: str) -> str:
+        return " ".join(title.replace("_", " ").split()).casefold()
+
+    def _remember(self, store: OrderedDict, key: str, value: Any) -> None:
+        with self._lock:
+            store[key] = value
+            store.move_to_end(key)
+            while len(store) > self.max_entries:
+                store.popitem(last=False)
+
+    def _lookup(self, title: str) -> Optional[Dict[str, Any]]:
+        key = self._key(title)
+        with self._lock:
+            # Follow normalization -> redirect chains
+            for _ in range(3):
+                key = self._aliases.get(key, key)
+            record = self._pages.get(key)
+            if record is not None:
+                self._pages.move_to_end(key)
+            return record
+
+    def _store_page(self, page: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn an API page object into a stored record"""
+        record = {
+            "title": page["title"],
+            "summary": page.get("extract", ""),
+            "url": page.get("fullurl", ""),
+            "disambiguation": "disambiguation" in page.get("pageprops", {}),
+            "options": None
+        }
+        self._remember(self._pages, self._key(page["title"]), record)
+        return record
+
+    def _store_aliases(self, query: Dict[str, Any]) -> None:
+        """Remember title normalizations and redirects from a response"""
+        for mapping in query.get("normalized", []) + query.get("redirects", []):
+            self._remember(self._aliases, self._key(mapping["from"]), self._key(mapping["to"]))
+
+    def search(self, term: str, limit: int = 5) -> List[str]:
+        """Return the titles of the top search results for a term"""
+        key = self._key(term)
+        with self._lock:
+            cached = self._searches.get(key)
+        # A stored search with at least as many results answers this one
+        if cached is not None and cached[0] >= limit:
+            return cached[1][:limit]
+
+        data = self._request({
+            "generator": "search",
+            "gsrsearch": term,
+            "gsrlimit": limit,
+            **self._page_props
+        })
+        query = data.get("query", {})
+        self._store_aliases(query)
+        pages = sorted(query.get("pages", {}).values(), key=lambda page: page.get("index", 0))
+        titles = [self._store_page(page)["title"] for page in pages if "missing" not in page]
+        self._remember(self._searches, key, (limit, titles))
+        return titles
+
+    def read(self, title: str) -> Dict[str, Any]:
+        """
+        Return {"title", "summary", "url"} for an article. Raises
+        wikipedia.DisambiguationError or wikipedia.PageError like the
+        wikipedia package does.
+        """
+        if not self._key(title):
+            # PageError takes a page id first and the title second
+            raise wikipedia.PageError(None, title)
+        record = self._lookup(title)
+        if record is None:
+            data = self._request({"titles": title, **self._page_props})
+            query = data.get("query", {})
+            self._store_aliases(query)
+            page = next(iter(query.get("pages", {}).values()), None)
+            if page is None or "missing" in page or "invalid" in page:
+                # Fall back to the best search match, which the search has
+                # already stored
+                suggestions = self.search(title, limit=1)
+                if not suggestions or self._key(suggestions[0]) == self._key(title):
+                    raise wikipedia.PageError(None, title)
+                record = self._lookup(suggestions[0])
+                if record is None:
+                    raise wikipedia.PageError(None, title)
+                self._remember(self._aliases, self._key(title), self._key(record["title"]))
+            else:
+                record = self._store_page(page)
+
+        if record["disambiguation"]:
+            if record["options"] is None:
+                record["options"] = self._disambiguation_options(record["title"])
+            raise wikipedia.DisambiguationError(record["title"], record["options"])
+        return record
+
+    def _disambiguation_options(self, title: str) -> List[str]:
+        data = self._request({
+            "titles": title,
+            "prop": "links",
+            "plnamespace": 0,
+            "pllimit": "max"
+        })
+        pages = data.get("query", {}).get("pages", {}).values()
+        return [link["title"] for page in pages for link in page.get("links", [])]
+
 
 class WikipediaTool:
     name = "wikipedia"
     description = "Search Wikipedia articles and read their content"
 
+    def __init__(self, backend=None, max_results: int = 5, max_summary_chars: int = 1000):
+        if backend is None and os.getenv("WIKIPEDIA_INDEX"):
+            # Answer from a local dump index instead of the live API
+            from .wikidump import DumpBackend
+            backend = DumpBackend(os.environ["WIKIPEDIA_INDEX"])
+        self.backend = backend if backend is not None else MediaWikiBackend()
+        # Size caps on the payload returned to the model
+        self.max_results = max_results
+        self.max_summary_chars = max_summary_chars
+
     def run(self, query: str) -> Dict[str, Any]:
         """
         Search Wikipedia or get article content based on the query type.
         Query format:
-        - "search:term" to search for articles
-        - "read:title" to get article content
+        - "search:term" to search for articles, returning a list of titles
+        - "read:title" to get article content as {title, summary, url}
         """
         try:
             if query.startswith("search:"):
                 search_term = query[7:].strip()  # Remove "search:" prefix
-                results = wikipedia.search(search_term, results=5)
+                results = self.backend.search(search_term, limit=self.max_results)
                 if not results:
                     return {
                         "success": True,
                         "result": "No Wikipedia articles found."
                     }
-                formatted_results = "\n".join([f"- {title}" for title in results])
                 return {
                     "success": True,
-                    "result": f"Found these articles:\n{formatted_results}"
+                    "result": results
                 }
-            
+
             elif query.startswith("read:"):
                 article_title = query[5:].strip()  # Remove "read:" prefix
+                if not article_title:
+                    return {
+                        "success": False,
+                        "result": "Error: Give an article title after 'read:'"
+                    }
                 try:
-                    # Try to get the most relevant page
-                    page = wikipedia.page(article_title, auto_suggest=True)
-                    # Get a summary (first few paragraphs)
-                    summary = wikipedia.summary(article_title, sentences=5)
+                    # Resolve the title and fetch summary and URL in one go
+                    page = self.backend.read(article_title)
                     return {
                         "success": True,
-                        "result": f"Title: {page.title}\n\nSummary:\n{summary}\n\nFull URL: {page.url}"
+                        "result": {
+                            "title": page["title"],
+                            "summary": truncate_text(page["summary"], self.max_summary_chars),
+                            "url": page["url"]
+                        }
                     }
                 except wikipedia.DisambiguationError as e:
                     options = "\n".join([f"- {option}" for option in e.options[:5]])
@@ -54,9 +254,9 @@ class WikipediaTool:
                     "success": False,
                     "result": "Error: Query must start with 'search:' or 'read:'"
                 }
-                
+
         except Exception as e:
             return {
                 "success": False,
                 "result": f"Error: {str(e)}"
-            } 
\ No newline at end of file
+            }
@@ -0,0 +1,142 @@
+from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import json
+import threading
+import time
+import uuid
+
+
+@dataclass
+class Span:
+    """One timed operation of an agent run: an LLM call, a tool call or the run itself"""
+    name: str
+    kind: str
+    trace_id: str
+    start: float
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.time()) - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes
+        }
+
+
+class InMemoryExporter:
+    """Keeps exported spans in a list, e.g. for tests"""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self.spans.extend(spans)
+
+
+class JSONLExporter:
+    """Appends each exported span as a JSON line to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class Trace:
+    """The spans of one agent run"""
+
+    def __init__(self, tracer: "Tracer", query: str):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.root = Span("run", "run", self.trace_id, time.time(), attributes={"query": query})
+        self.spans = [self.root]
+        self._finished = False
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attributes):
+        """Time the enclosed block as a span; the span's attributes can be added to inside it"""
+        span = Span(name, kind, self.trace_id, time.time(), attributes=attributes)
+        self.spans.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = repr(e)
+            raise
+        finally:
+            span.end = time.time()
+
+    def finish(self, **attributes) -> None:
+        """End the run and hand every span to the tracer's exporters"""
+        if self._finished:
+            return
+        self._finished = True
+        self.root.end = time.time()
+        self.root.attributes.update(attributes)
+        for exporter in self.tracer.exporters:
+            exporter.export(self.spans)
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-run totals and the time spent in each LLM call and tool"""
+        llm = [span for span in self.spans if span.kind == "llm"]
+        tools = [span for span in self.spans if span.kind == "tool"]
+        by_tool = {}
+        for span in tools:
+            entry = by_tool.setdefault(span.name, {
+                "calls": 0, "duration": 0.0, "cache_hits": 0, "prefetch_hits": 0, "deduplicated": 0
+            })
+            entry["calls"] += 1
+            entry["duration"] += span.duration
+            entry["cache_hits"] += int(bool(span.attributes.get("cached")))
+            entry["prefetch_hits"] += int(bool(span.attributes.get("prefetched")))
+            entry["deduplicated"] += int(bool(span.attributes.get("deduplicated")))
+        return {
+            "trace_id": self.trace_id,
+            "duration": self.root.duration,
+            "llm_calls": [
+                {
+                    "name": span.name,
+                    "duration": span.duration,
+                    "first_token": span.attributes.get("first_token"),
+                    "prompt_tokens": span.attributes.get("prompt_tokens"),
+                    "completion_tokens": span.attributes.get("completion_tokens")
+                }
+                for span in llm
+            ],
+            "llm_duration": sum(span.duration for span in llm),
+            "tool_calls": len(tools),
+            "tool_duration": sum(span.duration for span in tools),
+            "cache_hits": sum(entry["cache_hits"] for entry in by_tool.values()),
+            "prefetch_hits": sum(entry["prefetch_hits"] for entry in by_tool.values()),
+            # Repeated calls answered from the conversation's memo
+            "deduplicated": sum(entry["deduplicated"] for entry in by_tool.values()),
+            # The loop budget that ran out, if the answer was forced
+            "budget_exhausted": self.root.attributes.get("budget_exhausted"),
+            "tools": by_tool,
+            "prompt_tokens": sum(span.attributes.get("prompt_tokens") or 0 for span in llm),
+            "completion_tokens": sum(span.attributes.get("completion_tokens") or 0 for span in llm)
+        }
+
+
+class Tracer:
+    """Creates a Trace per agent run and exports finished traces"""
+
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters = list(exporters or [])
+
+    def start_trace(self, query: str) -> Trace:
+        return Trace(self, query)
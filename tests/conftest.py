@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app runs with src/ on the path (python src/app.py), so do the tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import benchmark
+from agent import LoopBudget
+from benchmark import build_agent
+
+SEARCH = ("google_search", {"query": "quantum computing news"})
+
+
+def run(agent, scenario, **kwargs):
+    async def collect():
+        return [event async for event in agent.astream(f"[{scenario}#0] Scripted question", **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_repeated_calls_do_not_count_as_tool_calls(monkeypatch):
+    # The same search twice in one turn, then once more in the next round
+    monkeypatch.setitem(benchmark.SCENARIOS, "repeats", [[SEARCH, SEARCH], [SEARCH], "Done."])
+    events = run(build_agent(0.0, 0.0, "off", False), "repeats")
+    results = [event for event in events if event.type == "tool_result"]
+    assert len(results) == 3 and all(event.data["success"] for event in results)
+    assert events[-1].data["usage"]["tool_calls"] == 1
+    assert events[-1].data["trace"]["deduplicated"] == 2
+
+
+def test_repeated_calls_fit_in_the_tool_call_budget(monkeypatch):
+    monkeypatch.setitem(benchmark.SCENARIOS, "repeats", [[SEARCH, SEARCH, SEARCH], "Done."])
+    events = run(build_agent(0.0, 0.0, "off", False), "repeats", budget=LoopBudget(max_tool_calls=1))
+    assert all(event.data["success"] for event in events if event.type == "tool_result")
+    assert events[-1].data["usage"]["tool_calls"] == 1
+
+
+def test_budget_is_unlimited_by_default():
+    budget = build_agent(0.0, 0.0, "off", False).budget
+    assert (budget.max_rounds, budget.max_tool_calls, budget.max_tokens, budget.max_seconds) == (None,) * 4
+
+
+def test_calls_waiting_for_a_slot_hold_no_thread_and_never_start_after_timing_out(monkeypatch):
+    searches = [("google_search", {"query": f"news {i}"}) for i in range(8)]
+    monkeypatch.setitem(benchmark.SCENARIOS, "burst", [searches + [("calculator", {"expression": "2 + 2"})], "Done."])
+    agent = build_agent(0.0, 0.3, "off", False)
+    # google_search allows 2 concurrent calls; 3 threads would all be taken
+    # by waiting searches if they held one
+    agent._executor = ThreadPoolExecutor(max_workers=3)
+    agent.tool_timeout = 0.45
+    search = agent.tools.get("google_search")
+    started = []
+    run_search = search.run
+    monkeypatch.setattr(search, "run", lambda query: started.append(query) or run_search(query))
+
+    events = run(agent, "burst")
+    results = {event.data["name"]: event for event in events if event.type == "tool_result"}
+    assert results["calculator"].data["success"]
+    # Two rounds of two searches started before the others timed out waiting
+    time.sleep(0.7)
+    assert len(started) == 4
@@ -0,0 +1,16 @@
+import json
+from batch import completed_ids
+
+
+def test_resume_retries_failed_queries(tmp_path):
+    output = tmp_path / "results.jsonl"
+    rows = [{"id": 1, "answer": "4", "error": None}, {"id": 2, "answer": None, "error": "Request timed out"}]
+    output.write_text("".join(json.dumps(row) + "\n" for row in rows) + '{"id": 3, "ans')
+    assert completed_ids(str(output)) == {"1"}
+    # The failed row and the partial line are gone, so the retry's result
+    # is the only one for its id
+    assert [json.loads(line)["id"] for line in output.read_text().splitlines()] == [1]
+
+
+def test_missing_output_file(tmp_path):
+    assert completed_ids(str(tmp_path / "results.jsonl")) == set()
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+import pytest
+import cache
+from cache import AnswerCache, MemoryCacheBackend, SQLiteCacheBackend, ToolCache, normalize_query
+
+
+class Clock:
+    """Stands in for time.time() in the cache module"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        self.now += 0.001
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(max_entries):
+        if request.param == "memory":
+            return MemoryCacheBackend(max_entries)
+        return SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries)
+    return make
+
+
+def test_normalize_query_ignores_case_spacing_and_closing_punctuation():
+    assert normalize_query("  What is  Quantum computing? ") == normalize_query("what is quantum computing")
+    assert normalize_query("What's 2 + 2?") == normalize_query("whats 2+2")
+
+
+def test_normalize_query_keeps_meaningful_punctuation():
+    assert normalize_query("What is 5!") != normalize_query("What is 5")
+    assert normalize_query("What is 5!?") == normalize_query("What is 5!")
+    assert normalize_query("What is (2+3)!") != normalize_query("What is (2+3)")
+    assert normalize_query("What happened at 10:30?") != normalize_query("What happened at 10 30?")
+    assert normalize_query("What is 1.5 * 2?") != normalize_query("What is 15 * 2?")
+
+
+def test_answer_ttls():
+    cache = AnswerCache()
+    assert cache.ttl(["calculator"]) is None
+    assert cache.ttl(["calculator", "datetime"]) == 60
+    # Answers given without tools may depend on the current time
+    assert cache.ttl([]) == 60
+    assert cache.ttl(["unknown_tool"]) == 3600
+
+
+def test_agent_caches_answers_only_when_asked():
+    from agent import AsyncAgent
+    assert AsyncAgent(openai_api_key="test").answer_cache is None
+    assert AsyncAgent(openai_api_key="test", cache_answers=True).answer_cache is not None
+    assert AsyncAgent(openai_api_key="test", answer_cache=AnswerCache()).answer_cache is not None
+
+
+def test_backends_evict_the_least_recently_used_entry(clock, make_backend):
+    backend = make_backend(max_entries=2)
+    backend.set("a", "1", None)
+    backend.set("b", "2", None)
+    assert backend.get("a") == ("1", None)
+    backend.set("c", "3", None)
+    # "b" was used least recently once "a" was read
+    assert backend.get("b") is None
+    assert (backend.get("a"), backend.get("c"), len(backend)) == (("1", None), ("3", None), 2)
+
+
+def test_tool_cache_expires_entries_and_counts_hits_per_tool(clock, make_backend):
+    tools = ToolCache(backend=make_backend(max_entries=10))
+    search = {"query": "quantum  computing"}
+    tools.set("google_search", search, {"success": True, "result": ["Qubit"]})
+    tools.set("calculator", {"expression": "2+2"}, {"success": True, "result": 4})
+    assert tools.get("google_search", {"query": "quantum computing"}) == {"success": True, "result": ["Qubit"]}
+
+    clock.now += 3600
+    # Search results expire after an hour; calculator results never do
+    assert tools.get("google_search", search) is None
+    assert tools.get("calculator", {"expression": "2+2"})["result"] == 4
+    assert tools.get("wikipedia", {"action": "read", "query": "Qubit"}) is None
+    stats = tools.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 1)
+    assert stats["per_tool"] == {
+        "calculator": {"hits": 1, "misses": 0},
+        "google_search": {"hits": 1, "misses": 1},
+        "wikipedia": {"hits": 0, "misses": 1}
+    }
+
+
+def test_sqlite_cache_survives_a_restart(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    ToolCache(backend=SQLiteCacheBackend(path)).set("calculator", {"expression": "2+2"}, {"success": True, "result": 4})
+    assert ToolCache(backend=SQLiteCacheBackend(path)).get("calculator", {"expression": "2+2"})["result"] == 4
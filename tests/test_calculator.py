@@ -0,0 +1,96 @@
+import time
+import pytest
+from tools.calc_engine import CalculatorEngine, CalculatorError
+from tools.calculator import CalculatorTool
+
+
+@pytest.fixture
+def engine():
+    return CalculatorEngine()
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2 + 2 * 5", 12),
+    ("math.sqrt(16) + abs(-3)", 7.0),
+    ("pow(2, 10)", 1024),
+    ("math.factorial(10)", 3628800),
+    ("math.prod([1, 2, 3, 4])", 24),
+    ("math.fsum([0.1] * 10)", 1.0),
+    # Just under the 10000-bit limit
+    ("10 ** 3000", 10 ** 3000),
+    ("2 ** 6000", 2 ** 6000),
+    ("10 ** 1500 * 10 ** 1500", 10 ** 3000),
+    ("round(123456, -3)", 123000),
+    ("[[1, 2]] * 3", [[1, 2]] * 3),
+])
+def test_matches_eval(engine, expression, expected):
+    assert engine.evaluate(expression) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')",
+    "math.__dict__",
+    "(1).__class__",
+    "open('x')",
+    "[x for x in (1, 2)]",
+    "'a' * 3",
+    "len([1]) if True else 0",
+])
+def test_rejects_disallowed_syntax(engine, expression):
+    with pytest.raises(CalculatorError):
+        engine.evaluate(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    # Big integers
+    "10 ** 100000",
+    "(10 ** 5000) * (10 ** 5000)",
+    "math.factorial(100000)",
+    "math.comb(10 ** 6, 500)",
+    # Sequence repetition and concatenation run in C
+    "[0] * 10 ** 7",
+    "(1,) * 10 ** 7",
+    "10 ** 9 * [0]",
+    "[0] * 10 ** 9",
+    "[0] * 6000 + [0] * 6000",
+    # Variadic math functions consume their arguments in C
+    "math.prod([7 ** 3000] * 300)",
+    "math.prod([7 ** 3000] * 1000)",
+    "math.prod((7 ** 3000, 7 ** 3000, 7 ** 3000, 7 ** 3000))",
+    "math.lcm(7 ** 3000, 11 ** 3000, 13 ** 3000)",
+    "math.fsum([0.5] * 10 ** 7)",
+    # Nested repetition holds count * inner length references
+    "[[1] * 10000] * 10000",
+    "[[[1] * 10000] * 10000] * 10000",
+    "[[]] * 10 ** 9",
+    # round(n, -k) computes 10 ** k in C
+    "round(1, -(10 ** 7))",
+    "round(5, -10 ** 8)",
+])
+def test_limits_are_enforced_before_work_starts(engine, expression):
+    started = time.perf_counter()
+    with pytest.raises(CalculatorError):
+        engine.evaluate(expression)
+    assert time.perf_counter() - started < 0.5
+
+
+def test_results_are_rendered_within_a_cap():
+    engine = CalculatorEngine(max_result_chars=50)
+    assert engine.format(engine.evaluate("[(1,), [2.5, ()]]")) == "[(1,), [2.5, ()]]"
+    assert len(engine.format(engine.evaluate("[[1] * 100] * 50"))) <= 50
+    result = CalculatorTool(engine).run("[1] * 1000")
+    assert result["success"] and result["result"].startswith("[1, 1, 1") and len(result["result"]) <= 50
+
+
+def test_tool_reports_errors():
+    tool = CalculatorTool()
+    assert tool.run("[0] * 10 ** 7") == {"success": False, "result": "Error: Sequence exceeds 10000 items"}
+    assert tool.run("2 + 3") == {"success": True, "result": "5"}
+
+
+def test_batch_matches_scalar(engine):
+    expressions = [f"{i}.5 * 2.0 + math.sqrt({i}.0)" for i in range(20)] + ["1 / 0", "[0] * 10 ** 9"]
+    results = engine.evaluate_many(expressions)
+    for expression, result in zip(expressions[:20], results):
+        assert result == {"success": True, "result": str(engine.evaluate(expression))}
+    assert [result["success"] for result in results[20:]] == [False, False]
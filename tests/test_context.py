@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+import context
+from context import ContextManager, TokenCounter
+
+
+class FakeEncoding:
+    """Counts one token per word and records what it encodes"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def test_encoding_is_loaded_on_first_count(monkeypatch):
+    loads = []
+    encoding = FakeEncoding()
+    monkeypatch.setattr(context, "tiktoken", SimpleNamespace(get_encoding=lambda name: loads.append(name) or encoding))
+    counter = TokenCounter()
+    assert loads == []
+    assert counter.count("one two three") == 3
+    assert loads == ["o200k_base"]
+
+
+def test_falls_back_to_estimate_when_encoding_cannot_load(monkeypatch):
+    def offline(name):
+        raise ConnectionError("no network")
+    monkeypatch.setattr(context, "tiktoken", SimpleNamespace(get_encoding=offline))
+    counter = TokenCounter()
+    assert counter.count("x" * 40) == 10
+    assert TokenCounter(encoding=None).count("x" * 41) == 11
+
+
+def test_messages_are_tokenized_once_across_rounds(monkeypatch):
+    encoding = FakeEncoding()
+    monkeypatch.setattr(context, "tiktoken", SimpleNamespace(get_encoding=lambda name: encoding))
+    manager = ContextManager(budget=10 ** 6)
+    messages = [{"role": "system", "content": "You are helpful"}, {"role": "user", "content": "Question"}]
+    for round_number in range(20):
+        messages.append({"role": "assistant", "content": f"Thought {round_number}"})
+        manager.prepare(messages)
+    # Each distinct text once, however many rounds carried it
+    assert len(encoding.encoded) == len({message["content"] for message in messages})
@@ -0,0 +1,28 @@
+import pytest
+from planning import is_simple_query
+
+
+@pytest.mark.parametrize("query", [
+    "2 + 2 * 5",
+    "What is 15% of 80?",
+    "Calculate sqrt(144)",
+    "what is 12 times 7",
+    "What day was it 8 days ago?",
+    "What date will it be 3 weeks from now?",
+    "What's today's date?",
+    "What day of the week is it?",
+])
+def test_simple_queries_skip_planning(query):
+    assert is_simple_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "1984",
+    "What is 42?",
+    "Who won the Champions League final today?",
+    "What is the weather tomorrow in Paris?",
+    "What was the stock price of Apple yesterday?",
+    "What is quantum computing according to Wikipedia?",
+])
+def test_other_queries_are_planned(query):
+    assert not is_simple_query(query)
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from benchmark import build_agent
+from prefetch import Prefetcher
+
+
+class BlockingRunner:
+    """Tool runner whose calls wait for a gate; records the calls that ran"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+
+    def __call__(self, tool_name, tool_args):
+        self.calls.append(tool_args["query"])
+        self.gate.wait(5)
+        return {"success": True, "result": f"Article {tool_args['query']}"}
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def reads(*titles):
+    return [{"action": "read", "query": title} for title in titles]
+
+
+def test_agent_serves_a_predicted_read_from_the_buffer():
+    agent = build_agent(0.05, 0.0, "off", False, prefetch=True)
+    wikipedia = agent.tools.get("wikipedia")
+    queries = []
+    run_wikipedia = wikipedia.run
+    wikipedia.run = lambda query: queries.append(query) or run_wikipedia(query)
+
+    async def collect():
+        return [event async for event in agent.astream("[multi_round#0] Scripted question")]
+
+    events = asyncio.run(collect())
+    read = [event for event in events if event.type == "tool_result" and event.data["name"] == "wikipedia"][-1]
+    assert read.data["success"]
+    # Both top results were read ahead; the model used the first
+    assert queries.count("read:Quantum computing") == 1
+    stats = agent.prefetcher.stats()
+    assert (stats["scheduled"], stats["hits"], stats["unused"], stats["buffered"]) == (2, 1, 1, 0)
+
+
+def test_pending_prefetch_is_cancelled_and_left_to_the_caller(executor):
+    prefetcher = Prefetcher()
+    runner = BlockingRunner()
+    prefetcher.schedule("wikipedia", reads("Qubit", "Quantum computing"), runner, executor)
+
+    # The second read is still queued behind the first, so it is not waited for
+    assert prefetcher.take("wikipedia", reads("Quantum computing")[0]) is None
+    runner.gate.set()
+    assert prefetcher.take("wikipedia", reads("Qubit")[0]) == {"success": True, "result": "Article Qubit"}
+    executor.shutdown(wait=True)
+    assert runner.calls == ["Qubit"]
+    stats = prefetcher.stats()
+    assert (stats["hits"], stats["unused"], stats["cancelled"]) == (1, 1, 1)
+
+
+def test_cancel_drops_only_the_owners_prefetches():
+    prefetcher = Prefetcher(top_k=1)
+    runner = BlockingRunner()
+    executor = ThreadPoolExecutor(max_workers=2)
+    prefetcher.schedule("wikipedia", reads("Qubit"), runner, executor, owner="run-1")
+    prefetcher.schedule("wikipedia", reads("Photon"), runner, executor, owner="run-2")
+    prefetcher.schedule("wikipedia", reads("Quark"), runner, executor, owner="run-1")
+    while len(runner.calls) < 2:
+        time.sleep(0.01)
+
+    prefetcher.cancel("run-1")
+    runner.gate.set()
+    assert prefetcher.take("wikipedia", reads("Qubit")[0]) is None
+    assert prefetcher.take("wikipedia", reads("Photon")[0]) == {"success": True, "result": "Article Photon"}
+    executor.shutdown(wait=True)
+    # The running prefetch finished, the queued one never started
+    assert sorted(runner.calls) == ["Photon", "Qubit"]
+    stats = prefetcher.stats()
+    assert (stats["scheduled"], stats["hits"], stats["unused"], stats["cancelled"]) == (3, 1, 2, 1)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from benchmark import build_agent, _chunk
+from tools.resilience import ConcurrencyLimit
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+
+class StallingCompletions:
+    """Sends one chunk, then never sends another"""
+
+    async def create(self, **kwargs):
+        async def chunks():
+            yield _chunk(content="Thinking")
+            await asyncio.sleep(3600)
+        return chunks()
+
+
+def test_stalled_stream_stops_at_the_deadline():
+    agent = build_agent(0.0, 0.0, "off", False)
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=StallingCompletions()))
+
+    async def run():
+        return [event async for event in agent.astream("[single_tool#0] Scripted question", deadline=0.2)]
+
+    started = time.perf_counter()
+    events = asyncio.run(run())
+    assert time.perf_counter() - started < 1.0
+    assert events[-1].type == "error"
+    assert "deadline" in events[-1].content
+
+
+def test_tools_package_imports_on_its_own(tmp_path):
+    # setup.py installs only the tools package, without the top-level modules
+    shutil.copytree(os.path.join(SRC, "tools"), tmp_path / "tools")
+    code = "import tools.search, tools.wikipedia_tool, tools.resilience"
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, check=True)
+
+
+def test_concurrency_limit_hands_slots_to_waiters_in_order():
+    limit = ConcurrencyLimit(1)
+    order = []
+
+    async def use(name, hold):
+        await limit.acquire()
+        order.append(name)
+        await asyncio.sleep(hold)
+        limit.release()
+
+    async def run():
+        first = asyncio.ensure_future(use("first", 0.05))
+        await asyncio.sleep(0)
+        assert not limit.try_acquire()
+        abandoned = asyncio.ensure_future(use("abandoned", 0))
+        second = asyncio.ensure_future(use("second", 0))
+        await asyncio.sleep(0)
+        # A waiter cancelled before its turn never gets the slot
+        abandoned.cancel()
+        await asyncio.gather(first, second)
+        # Released from a pool thread
+        assert limit.try_acquire()
+        await asyncio.get_running_loop().run_in_executor(None, limit.release)
+
+    asyncio.run(run())
+    assert order == ["first", "second"]
+    assert limit.in_use == 0
@@ -0,0 +1,59 @@
+import pytest
+import requests
+from serpapi import GoogleSearch
+from tools.search import GoogleSearchTool
+
+
+def response(status: int, body: str) -> requests.Response:
+    result = requests.Response()
+    result.status_code = status
+    result._content = body.encode()
+    return result
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Answers SerpAPI requests with the given responses in order"""
+    monkeypatch.setenv("SERPAPI_API_KEY", "test")
+    replies = []
+
+    def get_response(self, path="/search"):
+        assert self.params_dict["output"] == "json"
+        return replies.pop(0)
+
+    monkeypatch.setattr(GoogleSearch, "get_response", get_response)
+    return replies
+
+
+def make_tool() -> GoogleSearchTool:
+    tool = GoogleSearchTool()
+    tool.retry_policy.base_delay = 0
+    return tool
+
+
+def test_server_errors_and_rate_limits_are_retried(serve):
+    serve.extend([
+        response(503, "<html>Service Unavailable</html>"),
+        response(429, '{"error": "Too many requests"}'),
+        response(200, '{"organic_results": [{"title": "Qubit", "snippet": "A unit", "link": "https://q"}]}'),
+    ])
+    result = make_tool().run("qubit")
+    assert result == {"success": True, "result": [{"title": "Qubit", "snippet": "A unit", "url": "https://q"}]}
+    assert not serve
+
+
+def test_client_errors_are_reported_without_retrying(serve):
+    serve.extend([
+        response(401, '{"error": "Invalid API key."}'),
+        response(200, '{"organic_results": []}'),
+    ])
+    assert make_tool().run("qubit") == {"success": False, "result": "Error: Invalid API key."}
+    assert len(serve) == 1
+
+
+def test_persistent_server_errors_fail_after_the_retries(serve):
+    serve.extend(response(502, "<html>Bad Gateway</html>") for _ in range(3))
+    result = make_tool().run("qubit")
+    assert not result["success"]
+    assert "HTTP 502" in result["result"]
+    assert not serve
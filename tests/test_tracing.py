@@ -0,0 +1,50 @@
+import asyncio
+import benchmark
+from benchmark import build_agent
+from tracing import InMemoryExporter, Tracer
+
+SEARCH = ("google_search", {"query": "quantum computing news"})
+READ = ("wikipedia", {"action": "read", "query": "Qubit"})
+
+
+def test_spans_record_each_call_and_the_summary_adds_them_up(monkeypatch):
+    monkeypatch.setitem(benchmark.SCENARIOS, "traced", [[SEARCH, READ], [SEARCH], "Done."])
+    agent = build_agent(0.0, 0.0, "off", True)
+    exporter = InMemoryExporter()
+    agent.tracer = Tracer([exporter])
+
+    async def collect():
+        # The second run's search is answered by the tool cache
+        runs = []
+        for _ in range(2):
+            runs.append([event async for event in agent.astream("[traced#0] Scripted question")])
+        return runs
+
+    first, second = asyncio.run(collect())
+    assert len(exporter.spans) == 2 * 7
+    summary = first[-1].data["trace"]
+    spans = [span for span in exporter.spans if span.trace_id == summary["trace_id"]]
+    llm = [span for span in spans if span.kind == "llm"]
+    tools = [span for span in spans if span.kind == "tool"]
+
+    assert [span.attributes["round"] for span in llm] == [1, 2, 3]
+    for span in llm:
+        assert 0 < span.attributes["first_token"] <= span.duration
+        assert span.attributes["prompt_tokens"] > 0 and span.attributes["completion_tokens"] > 0
+    search, read, repeated = tools
+    assert (search.name, read.name, repeated.name) == ("google_search", "wikipedia", "google_search")
+    assert not search.attributes["cached"] and not read.attributes["cached"]
+    assert repeated.attributes["deduplicated"]
+    assert repeated.attributes["result_chars"] == search.attributes["result_chars"] > 0
+
+    assert summary["tool_calls"] == 3
+    assert (summary["cache_hits"], summary["deduplicated"]) == (0, 1)
+    assert summary["tools"]["google_search"]["calls"] == 2
+    assert summary["prompt_tokens"] == first[-1].data["usage"]["prompt_tokens"] == sum(span.attributes["prompt_tokens"] for span in llm)
+    assert summary["completion_tokens"] == sum(span.attributes["completion_tokens"] for span in llm)
+    assert [call["first_token"] for call in summary["llm_calls"]] == [span.attributes["first_token"] for span in llm]
+    assert summary["llm_duration"] == sum(span.duration for span in llm)
+
+    cached = second[-1].data["trace"]
+    assert (cached["cache_hits"], cached["deduplicated"]) == (2, 1)
+    assert (cached["tools"]["wikipedia"]["calls"], cached["tools"]["wikipedia"]["cache_hits"]) == (1, 1)
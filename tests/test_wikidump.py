@@ -0,0 +1,57 @@
+import pytest
+import wikipedia
+from tools.wikidump import DumpBackend, FIXTURE_PATH, build_index, first_sentences
+from tools.wikipedia_tool import WikipediaTool
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory):
+    return DumpBackend.from_source(FIXTURE_PATH, str(tmp_path_factory.mktemp("wiki_index")))
+
+
+def test_redirects_resolve_to_their_target(backend):
+    assert backend.read("Einstein")["title"] == "Albert Einstein"
+    page = backend.read("quantum_computer")
+    assert page["title"] == "Quantum computing"
+    assert page["url"] == "https://en.wikipedia.org/wiki/Quantum_computing"
+    # A redirect is found by search as its target, not listed twice
+    assert backend.search("Quantum computer") == ["Quantum computing"]
+
+
+def test_prefix_search(backend):
+    # Exact title first, then titles starting with the term, then title words
+    assert backend.search("pyth") == ["Python", "Python (programming language)", "Pythonidae", "Monty Python"]
+    assert backend.search("QUANTUM") == ["Quantum computing", "Quantum mechanics"]
+    assert backend.search("einstein") == ["Albert Einstein"]
+    assert backend.search("pyth", limit=2) == ["Python", "Python (programming language)"]
+    assert backend.search("xyzzy") == []
+
+
+def test_disambiguation(backend):
+    with pytest.raises(wikipedia.DisambiguationError) as e:
+        backend.read("python")
+    assert e.value.options == ["Python (programming language)", "Pythonidae", "Monty Python"]
+    result = WikipediaTool(backend=backend).run("read:Python")
+    assert not result["success"]
+    assert "- Pythonidae" in result["result"]
+
+
+def test_missing_and_empty_titles(backend):
+    with pytest.raises(wikipedia.PageError) as e:
+        backend.read("Xyzzy plugh")
+    assert e.value.title == "Xyzzy plugh"
+    with pytest.raises(wikipedia.PageError):
+        backend.read("  ")
+    tool = WikipediaTool(backend=backend)
+    assert tool.run("read:") == {"success": False, "result": "Error: Give an article title after 'read:'"}
+
+
+def test_index_metadata(tmp_path):
+    meta = build_index(FIXTURE_PATH, str(tmp_path), sentences=2)
+    assert meta["redirects"] == 2
+    assert meta["sentences"] == 2
+
+
+def test_first_sentences_skips_abbreviations():
+    text = "Dr. Smith moved to the U.S. in 1990. She taught physics. Later she retired."
+    assert first_sentences(text, 2) == "Dr. Smith moved to the U.S. in 1990. She taught physics."
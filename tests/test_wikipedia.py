@@ -0,0 +1,87 @@
+import json
+import os
+import pytest
+import wikipedia
+from tools.wikipedia_tool import MediaWikiBackend, WikipediaTool
+
+RESPONSES = os.path.join(os.path.dirname(__file__), "data", "mediawiki_responses.json")
+
+
+class RecordedAPI:
+    """Replays recorded MediaWiki API responses and counts the requests"""
+
+    def __init__(self):
+        with open(RESPONSES, encoding="utf-8") as f:
+            self.records = json.load(f)
+        self.requests = []
+
+    def __call__(self, params):
+        self.requests.append(params)
+        for record in self.records:
+            if record["params"] == params:
+                return record["response"]
+        raise AssertionError(f"No recorded response for {params}")
+
+
+@pytest.fixture
+def api():
+    return RecordedAPI()
+
+
+@pytest.fixture
+def tool(api):
+    return WikipediaTool(backend=MediaWikiBackend(request_fn=api))
+
+
+def test_read_after_search_needs_no_request(tool, api):
+    assert tool.run("search:quantum computing")["result"] == ["Quantum computing", "Qubit"]
+    result = tool.run("read:Qubit")
+    assert result["success"]
+    assert result["result"]["url"] == "https://en.wikipedia.org/wiki/Qubit"
+    assert len(api.requests) == 1
+
+
+def test_repeated_search_is_served_from_memory(tool, api):
+    tool.run("search:quantum computing")
+    assert tool.run("search:Quantum  Computing")["result"] == ["Quantum computing", "Qubit"]
+    assert len(api.requests) == 1
+
+
+def test_redirect_resolves_in_one_request(tool, api):
+    result = tool.run("read:quantum_computer")
+    assert result["result"]["title"] == "Quantum computing"
+    # The normalization and redirect are remembered
+    assert tool.run("read:Quantum computer")["result"]["title"] == "Quantum computing"
+    assert tool.run("read:Quantum computing")["success"]
+    assert len(api.requests) == 1
+
+
+def test_summary_length_is_left_to_the_api(api):
+    backend = MediaWikiBackend(request_fn=api)
+    page = backend.read("United States")
+    assert page["summary"].startswith("The United States of America (U.S.A. or USA)")
+    assert "Washington, D.C." in page["summary"]
+    assert api.requests[0]["exsentences"] == 5
+
+
+def test_disambiguation_fetches_options_once(tool, api):
+    for _ in range(2):
+        result = tool.run("read:Mercury")
+        assert not result["success"]
+        assert "- Mercury (planet)" in result["result"]
+    assert len(api.requests) == 2
+    with pytest.raises(wikipedia.DisambiguationError):
+        MediaWikiBackend(request_fn=api).read("Mercury")
+
+
+def test_missing_page(tool, api):
+    result = tool.run("read:Xyzzy plugh")
+    assert result == {"success": False, "result": "No Wikipedia article found with title: Xyzzy plugh"}
+    assert len(api.requests) == 2
+
+
+def test_empty_title_is_rejected_without_a_request(tool, api):
+    assert tool.run("read:  ") == {"success": False, "result": "Error: Give an article title after 'read:'"}
+    with pytest.raises(wikipedia.PageError):
+        MediaWikiBackend(request_fn=api).read("")
+    assert api.requests == []